@@ -0,0 +1,250 @@
+"""
+End-to-end ingestion benchmark: the landing pipeline against the local mock LunarCrush
+server (mock_lunar_server.py) and the Postgres database from config.connection_string.
+
+Stages timed per request: fetch (network), decode (JSON), parse (parse_lunar_data),
+save (save_lunar_data into the buffer, or the merge into landing.lunar_data for the async
+run) and dump (dump_lunar_buffer, including the summary table refreshes). Reports p50/p95/mean per stage, rows/s and requests/s, and can save the
+result as a baseline and compare later runs against it.
+
+Use a scratch database: the benchmark writes symbols 900001.. into landing.lunar_data
+through its own buffer table (landing.bench_buffer_lunar_data, dropped afterwards), so
+rows other writers left in landing.buffer_lunar_data are never merged or truncated. Its
+own rows are deleted afterwards.
+
+Usage:
+python bench_ingestion.py [--symbols 20] [--hours 720] [--latency 0.05] [--minute-limit 600]
+                          [--concurrency 5] [--save baseline.json] [--baseline baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from mock_lunar_server import MockLunarServer
+
+# The pipeline reads these at import time: measure the network path, skip the Parquet export
+os.environ.setdefault("LUNAR_CACHE", "off")
+os.environ.setdefault("LUNAR_MIRROR", "off")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'landing')))
+
+
+# Benchmark symbols live far above real LunarCrush ids
+bench_symbol_offset = 900_000
+
+stages = ['fetch', 'decode', 'parse', 'save', 'dump']
+
+# Buffer of the sync run, same layout as landing.buffer_lunar_data
+bench_buffer = 'bench_buffer_lunar_data'
+
+
+def summarize(timings: dict[str, list[float]]) -> dict:
+    summary = {}
+    for stage, values in timings.items():
+        if not values:
+            continue
+        values = np.array(values)
+        summary[stage] = {
+            "count": len(values),
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "total": float(values.sum()),
+        }
+    return summary
+
+
+def run_sync(symbol_ids: list[int], start_time: str, end_time: str, dump_every: int) -> dict:
+    """
+    The landing_process path: one request at a time through the shared LunarClient.
+    """
+    from lunar_data import build_lunar_data_url, parse_lunar_data, save_lunar_data
+    from lunar_http import get_lunar_client
+    from utils import dump_lunar_buffer
+
+    client = get_lunar_client()
+    timings = {stage: [] for stage in stages}
+    result_codes = {}
+    rows = 0
+
+    start = time.perf_counter()
+    for i, symbol_id in enumerate(symbol_ids, start=1):
+        url = build_lunar_data_url(symbol_id, start_time, end_time)
+        result_code, data = client.get_json(url, "key_outlook", "bench_ingestion")
+        result_codes[result_code] = result_codes.get(result_code, 0) + 1
+        if result_code != 1:
+            continue
+        timings['fetch'].append(client.last_timing['network_time'])
+        timings['decode'].append(client.last_timing['decode_time'])
+
+        parse_start = time.perf_counter()
+        result_code, data_df = parse_lunar_data(symbol_id, data)
+        timings['parse'].append(time.perf_counter() - parse_start)
+
+        if not data_df.empty:
+            save_start = time.perf_counter()
+            save_result_code, _ = save_lunar_data(data_df, table_name=bench_buffer)
+            timings['save'].append(time.perf_counter() - save_start)
+            if save_result_code == 1:
+                rows += len(data_df)
+
+        if i % dump_every == 0 or i == len(symbol_ids):
+            dump_start = time.perf_counter()
+            dump_lunar_buffer(f"landing.{bench_buffer}")
+            timings['dump'].append(time.perf_counter() - dump_start)
+    elapsed_time = time.perf_counter() - start
+
+    return {"mode": "sync", "elapsed_time": elapsed_time, "rows": rows, "requests": len(symbol_ids),
+            "rows_per_sec": rows / elapsed_time, "requests_per_sec": len(symbol_ids) / elapsed_time,
+            "result_codes": result_codes, "stages": summarize(timings)}
+
+
+def run_async(symbol_ids: list[int], start_time: str, end_time: str, concurrency: int) -> dict:
+    """
+    The landing_process_etl path: concurrent fetches, merges straight into landing.lunar_data.
+    """
+    from lunar_client import AsyncLunarClient
+    from lunar_data import save_lunar_data
+    from rate_limiter import RateLimiter
+
+    timings = {stage: [] for stage in stages if stage != 'dump'}
+    result_codes = {}
+    rows = 0
+
+    async def process(client, symbol_id):
+        nonlocal rows
+        result_code, data_df = await client.get_lunar_data(symbol_id, start_time, end_time)
+        result_codes[result_code] = result_codes.get(result_code, 0) + 1
+        if result_code != 1:
+            return
+        # Per request timing of this task, queueing for the semaphore is not part of fetch
+        timing = client.last_timing
+        timings['fetch'].append(timing['network_time'])
+        timings['decode'].append(timing['decode_time'])
+        timings['parse'].append(timing['parse_time'])
+        if not data_df.empty:
+            save_start = time.perf_counter()
+            save_result_code, _ = await asyncio.to_thread(save_lunar_data, data_df, merge=True)
+            timings['save'].append(time.perf_counter() - save_start)
+            if save_result_code == 1:
+                rows += len(data_df)
+
+    async def main():
+        # The mock decides about 429s, the client-side limiter stays out of the way
+        limiter = RateLimiter("key_outlook", minute_limit=None, hour_limit=None, day_limit=None)
+        async with AsyncLunarClient(max_concurrency=concurrency, limiter=limiter) as client:
+            await asyncio.gather(*(process(client, symbol_id) for symbol_id in symbol_ids))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed_time = time.perf_counter() - start
+
+    return {"mode": f"async x{concurrency}", "elapsed_time": elapsed_time, "rows": rows, "requests": len(symbol_ids),
+            "rows_per_sec": rows / elapsed_time, "requests_per_sec": len(symbol_ids) / elapsed_time,
+            "result_codes": result_codes, "stages": summarize(timings)}
+
+
+def create_bench_buffer() -> None:
+    from db import get_engine
+
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS landing.{bench_buffer}"))
+        connection.execute(text(f"CREATE TABLE landing.{bench_buffer} (LIKE landing.buffer_lunar_data INCLUDING DEFAULTS)"))
+
+
+def drop_bench_buffer() -> None:
+    from db import get_engine
+
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS landing.{bench_buffer}"))
+
+
+def cleanup(symbol_ids: list[int], base_url: str) -> None:
+    from db import get_engine
+    from request_logger import get_api_request_writer
+    from summary_refresh import summaries
+
+    get_api_request_writer().flush()
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM landing.lunar_data WHERE symbol_id = ANY(:symbol_ids)"), {'symbol_ids': symbol_ids})
+        connection.execute(text(f"TRUNCATE TABLE landing.{bench_buffer}"))
+        for summary in summaries:
+            connection.execute(text(f"DELETE FROM {summary} WHERE symbol_id = ANY(:symbol_ids)"), {'symbol_ids': symbol_ids})
+        connection.execute(text("DELETE FROM public.api_request_logs WHERE url LIKE :base_url"), {'base_url': f"{base_url}%"})
+
+
+def print_result(result: dict, baseline: dict | None = None) -> None:
+    print(f"\n{result['mode']} | {result['requests']} requests | {result['rows']} rows | {result['elapsed_time']:.2f} s"
+          f" | {result['requests_per_sec']:.2f} req/s | {result['rows_per_sec']:.0f} rows/s | codes: {result['result_codes']}")
+
+    previous = (baseline or {}).get(result['mode'], {}).get('stages', {})
+    for stage, stats in result['stages'].items():
+        line = f"  {stage:<11} n={stats['count']:<5} p50={stats['p50'] * 1000:9.1f} ms  p95={stats['p95'] * 1000:9.1f} ms  mean={stats['mean'] * 1000:9.1f} ms"
+        if stage in previous:
+            change = (stats['p50'] / previous[stage]['p50'] - 1) * 100 if previous[stage]['p50'] else 0.0
+            line += f"  p50 vs baseline: {change:+.1f}%"
+        print(line)
+
+    if baseline and result['mode'] in baseline:
+        change = (result['rows_per_sec'] / baseline[result['mode']]['rows_per_sec'] - 1) * 100
+        print(f"  rows/s vs baseline: {change:+.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--hours', type=int, default=720, help="hourly rows per request")
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--minute-limit', type=int, default=None, help="mock answers 429 above this rate")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of random 429s")
+    parser.add_argument('--concurrency', type=int, default=5)
+    parser.add_argument('--dump-every', type=int, default=10)
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a JSON file written by --save")
+    args = parser.parse_args()
+
+    server = MockLunarServer(latency=args.latency, jitter=args.jitter, max_rows=args.hours,
+                             minute_limit=args.minute_limit, error_rate=args.error_rate).start()
+    os.environ["LUNAR_BASE_URL"] = server.base_url
+
+    end = datetime.now().replace(minute=0, second=0, microsecond=0)
+    start = end - pd.Timedelta(hours=args.hours - 1)
+    start_time, end_time = start.strftime("%d.%m.%Y %H:%M"), end.strftime("%d.%m.%Y %H:%M")
+    symbol_ids = list(range(bench_symbol_offset + 1, bench_symbol_offset + args.symbols + 1))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    create_bench_buffer()
+    try:
+        for run in [lambda: run_sync(symbol_ids, start_time, end_time, args.dump_every),
+                    lambda: run_async(symbol_ids, start_time, end_time, args.concurrency)]:
+            cleanup(symbol_ids, server.base_url)
+            result = run()
+            results[result['mode']] = result
+            print_result(result, baseline)
+    finally:
+        cleanup(symbol_ids, server.base_url)
+        drop_bench_buffer()
+        server.stop()
+
+    print(f"\nMock server: {server.stats}")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
@@ -0,0 +1,120 @@
+"""
+Bytes per row of LunarCrush frames with and without typed columns.
+
+    parse  get_lunar_data output: untyped (float64, object for fields the payload leaves out)
+           against parse_lunar_data, typed with utils.lunar_write_dtypes
+    read   read_symbol_data output: what pd.read_sql_query returns (int64, float64 for integer
+           columns with NULLs) against the compact utils.lunar_data_dtypes
+    copy   CSV bytes per row streamed by copy_dataframe into landing.lunar_data
+
+The write path keeps the table's precision, the run fails if parse_lunar_data changes a value.
+
+Payloads come from the mock server's generator, no server or database is needed.
+
+Usage:
+python bench_lunar_dtypes.py [--symbols 20] [--hours 720] [--missing spam volatility]
+"""
+import argparse
+import io
+
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'landing')))
+from utils import apply_lunar_dtypes
+from lunar_data import final_columns, parse_lunar_data
+from mock_lunar_server import MockLunarServer, count_fields
+
+
+def parse_untyped(symbol_id: int, data: dict) -> pd.DataFrame:
+    """
+    parse_lunar_data before lunar_data_dtypes: missing fields are filled with None.
+    """
+    data_df = pd.DataFrame(data['data']).rename(columns={'time': 'time_unix'})
+    data_df['symbol_id'] = symbol_id
+    data_df['datetime'] = pd.to_datetime(data_df['time_unix'], unit='s')
+    for col in final_columns:
+        if col not in data_df.columns:
+            data_df[col] = None
+    return data_df[final_columns]
+
+
+def as_read_sql(data_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The dtypes pd.read_sql_query gives landing.lunar_data: bigint as int64, or float64 when
+    the column holds NULLs, double precision as float64.
+    """
+    dtypes = {}
+    for col in data_df.columns:
+        if col == 'datetime':
+            continue
+        if col in count_fields or col in ('symbol_id', 'time_unix'):
+            dtypes[col] = 'float64' if data_df[col].isna().any() else 'int64'
+        else:
+            dtypes[col] = 'float64'
+    return data_df.astype(dtypes)
+
+
+def csv_bytes(data_df: pd.DataFrame) -> int:
+    """
+    Size of the CSV copy_dataframe streams to COPY. Float columns of integer tables are sent
+    as Int64 there, as copy_dataframe does.
+    """
+    integer_columns = [col for col in data_df.columns
+                       if (col in count_fields or col in ('symbol_id', 'time_unix')) and data_df[col].dtype.kind in 'fO']
+    data_df = data_df.astype({col: 'Int64' for col in integer_columns})
+    if pa is not None:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(pa.Table.from_pandas(data_df, preserve_index=False), buffer,
+                         pa_csv.WriteOptions(include_header=False))
+        return buffer.getbuffer().nbytes
+    return len(data_df.to_csv(index=False, header=False).encode())
+
+
+def bytes_per_row(data_df: pd.DataFrame) -> float:
+    return data_df.memory_usage(index=False, deep=True).sum() / len(data_df)
+
+
+def run_benchmark(symbols: int, hours: int, missing: list[str]) -> pd.DataFrame:
+    server = MockLunarServer(max_rows=hours)
+    untyped, typed = [], []
+    for symbol_id in range(1, symbols + 1):
+        data = server._time_series(symbol_id, 1700000000, 1700000000 + hours * 3600)
+        for row in data['data']:
+            for field in missing:
+                row.pop(field, None)
+        untyped.append(parse_untyped(symbol_id, data))
+        typed.append(parse_lunar_data(symbol_id, data)[1])
+    untyped = pd.concat(untyped, ignore_index=True)
+    typed = pd.concat(typed, ignore_index=True)
+    pd.testing.assert_frame_equal(typed.astype(object).where(typed.notna(), None),
+                                  untyped.astype(object).where(untyped.notna(), None),
+                                  check_dtype=False)
+
+    results = pd.DataFrame([
+        {'path': 'parse', 'before': bytes_per_row(untyped), 'after': bytes_per_row(typed)},
+        {'path': 'read', 'before': bytes_per_row(as_read_sql(typed)), 'after': bytes_per_row(apply_lunar_dtypes(as_read_sql(typed)))},
+        {'path': 'copy', 'before': csv_bytes(untyped) / len(untyped), 'after': csv_bytes(typed) / len(typed)},
+    ])
+    results['saved'] = 1 - results['after'] / results['before']
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--hours', type=int, default=720)
+    parser.add_argument('--missing', nargs='*', default=[], help="fields left out of the payload")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.symbols, args.hours, args.missing)
+    print(f"{args.symbols} symbols x {args.hours} hours, bytes per row")
+    for row in results.itertuples(index=False):
+        print(f"{row.path:<6} | {row.before:8.1f} -> {row.after:8.1f} | saved {row.saved:6.1%}")
@@ -0,0 +1,93 @@
+"""
+Compares the per-column groupby/shift implementation of read_market_data_summary_1_24
+with calculate_market_changes on synthetic market_data_summary_1_24 rows
+(latest, 1h and 24h records per symbol). No database needed.
+
+Usage:
+python bench_market_summary.py [symbols ...]
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'loading')))
+from dash_data_functions import calculate_market_changes, market_data_columns
+
+
+def make_summary_frame(symbols: int, missing: float = 0.05) -> pd.DataFrame:
+    """
+    Builds rows shaped like landing.market_data_summary_1_24; a share of the 1h/24h records is dropped.
+    """
+    rng = np.random.default_rng(42)
+    latest = 1727740800
+    offsets = np.array([86400, 3600, 0])
+
+    symbol_id = np.repeat(np.arange(1, symbols + 1), len(offsets))
+    time_unix = latest - np.tile(offsets, symbols)
+    data_df = pd.DataFrame({'symbol_id': symbol_id, 'time_unix': time_unix})
+    data_df['datetime'] = pd.to_datetime(data_df['time_unix'], unit='s')
+    for col in market_data_columns:
+        data_df[col] = rng.random(len(data_df)) * 1000
+
+    keep = (data_df['time_unix'] == latest) | (rng.random(len(data_df)) >= missing)
+    return data_df[keep].reset_index(drop=True)
+
+
+def groupby_shift(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    The previous implementation: two groupby shifts per column.
+    """
+    data = data.sort_values(by=['symbol_id', 'datetime'])
+    latest_data = data.groupby('symbol_id').last().reset_index()
+    for col in market_data_columns:
+        shift_1h = data.groupby('symbol_id')[col].shift(1)
+        shift_24h = data.groupby('symbol_id')[col].shift(2)
+        latest_data[f'{col}_r_1h'] = (latest_data[col] - shift_1h) / shift_1h * 100
+        latest_data[f'{col}_d_1h'] = latest_data[col] - shift_1h
+        latest_data[f'{col}_r_24h'] = (latest_data[col] - shift_24h) / shift_24h * 100
+        latest_data[f'{col}_d_24h'] = latest_data[col] - shift_24h
+    return latest_data
+
+
+def check_alignment(data: pd.DataFrame, result: pd.DataFrame) -> None:
+    """
+    Recomputes close deltas with a plain merge and compares them with the engine output.
+    """
+    latest = data.loc[data.groupby('symbol_id')['time_unix'].idxmax(), ['symbol_id', 'time_unix', 'close']]
+    for suffix, seconds in [('1h', 3600), ('24h', 86400)]:
+        prior = data[['symbol_id', 'time_unix', 'close']].assign(time_unix=data['time_unix'] + seconds)
+        expected = latest.merge(prior, on=['symbol_id', 'time_unix'], how='left', suffixes=('', '_prior'))
+        expected = (expected['close'] - expected['close_prior']).to_numpy()
+        np.testing.assert_allclose(result[f'close_d_{suffix}'].to_numpy(), expected, equal_nan=True)
+
+
+def run_benchmark(sizes: list[int], repeat: int = 3) -> pd.DataFrame:
+    methods = {'groupby_shift': groupby_shift, 'vectorized': calculate_market_changes}
+    results = []
+
+    for symbols in sizes:
+        data_df = make_summary_frame(symbols)
+        check_alignment(data_df, calculate_market_changes(data_df))
+
+        for method, calculate in methods.items():
+            timings = []
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                calculate(data_df)
+                timings.append(time.perf_counter() - start_time)
+            elapsed_time = min(timings)
+
+            results.append({'symbols': symbols, 'method': method, 'seconds': elapsed_time})
+            print(f"{symbols:>8} | {method:<13} | {elapsed_time:8.4f} s")
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1_000, 10_000, 100_000]
+    results = run_benchmark(sizes)
+    print(results.pivot(index='symbols', columns='method', values='seconds').assign(speedup=lambda df: df['groupby_shift'] / df['vectorized']))
@@ -0,0 +1,86 @@
+"""
+Compares DataFrame.to_sql against the COPY loader used by save_lunar_data.
+Writes into a scratch copy of landing.buffer_lunar_data that is dropped afterwards.
+
+Usage:
+python bench_save_lunar_data.py [rows ...]
+"""
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'landing')))
+from db import get_engine, copy_dataframe
+from lunar_data import final_columns
+
+BENCH_TABLE = 'bench_lunar_data'
+
+
+def make_lunar_frame(rows: int, symbol_id: int = 1) -> pd.DataFrame:
+    """
+    Builds a synthetic frame with the layout returned by get_lunar_data.
+    """
+    rng = np.random.default_rng(42)
+    time_unix = 1451606400 + np.arange(rows, dtype=np.int64) * 3600
+
+    data_df = pd.DataFrame({col: rng.random(rows) * 1000 for col in final_columns})
+    data_df['symbol_id'] = symbol_id
+    data_df['time_unix'] = time_unix
+    data_df['datetime'] = pd.to_datetime(time_unix, unit='s')
+
+    # Counts come back from the API with gaps
+    for col in ['contributors_active', 'contributors_created', 'posts_active', 'posts_created', 'interactions', 'alt_rank', 'spam']:
+        values = rng.integers(0, 100000, rows).astype('float64')
+        values[rng.random(rows) < 0.05] = np.nan
+        data_df[col] = values
+
+    return data_df[final_columns]
+
+
+def save_to_sql(connection, data_df):
+    data_df.to_sql(BENCH_TABLE, connection, schema='landing', if_exists='append', index=False)
+
+
+def save_copy(connection, data_df):
+    copy_dataframe(connection, data_df, BENCH_TABLE, schema='landing')
+
+
+def run_benchmark(sizes: list[int]) -> pd.DataFrame:
+    engine = get_engine("ingestion")
+    methods = {'to_sql': save_to_sql, 'copy': save_copy}
+    results = []
+
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE IF EXISTS landing.{BENCH_TABLE}"))
+        connection.execute(text(f"CREATE TABLE landing.{BENCH_TABLE} (LIKE landing.buffer_lunar_data INCLUDING DEFAULTS)"))
+
+    try:
+        for rows in sizes:
+            data_df = make_lunar_frame(rows)
+            for method, save in methods.items():
+                with engine.begin() as connection:
+                    connection.execute(text(f"TRUNCATE TABLE landing.{BENCH_TABLE}"))
+
+                start_time = time.perf_counter()
+                with engine.begin() as connection:
+                    save(connection, data_df)
+                elapsed_time = time.perf_counter() - start_time
+
+                results.append({'rows': rows, 'method': method, 'seconds': elapsed_time, 'rows_per_sec': rows / elapsed_time})
+                print(f"{rows:>9} | {method:<6} | {elapsed_time:8.3f} s | {rows / elapsed_time:12.0f} rows/s")
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE IF EXISTS landing.{BENCH_TABLE}"))
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    results = run_benchmark(sizes)
+    print(results.pivot(index='rows', columns='method', values='seconds').assign(speedup=lambda df: df['to_sql'] / df['copy']))
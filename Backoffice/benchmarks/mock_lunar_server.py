@@ -0,0 +1,210 @@
+"""
+Local mock of the LunarCrush endpoints used by the landing pipeline:
+
+    /api4/public/coins/list/v1
+    /api4/public/coins/<id>/time-series/v2?bucket=hour&start=<unix>&end=<unix>
+
+Latency, payload size and 429 behaviour are configurable. Point the pipeline at it with
+LUNAR_BASE_URL=<server.base_url> (set before the landing modules are imported).
+
+Usage:
+python mock_lunar_server.py [port]
+"""
+import gzip
+import json
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+
+# Metric fields of a time-series/v2 row, as returned by the API
+series_fields = [
+    'open', 'high', 'low', 'close', 'volume_24h', 'market_cap', 'circulating_supply', 'sentiment',
+    'contributors_active', 'contributors_created', 'posts_active', 'posts_created', 'interactions',
+    'social_dominance', 'galaxy_score', 'volatility', 'alt_rank', 'spam'
+]
+
+count_fields = {'contributors_active', 'contributors_created', 'posts_active', 'posts_created',
+                'interactions', 'alt_rank', 'spam'}
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive connections at the end of a run are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLunarServer:
+    """
+    Threaded HTTP server answering like LunarCrush.
+
+    Args:
+    port (int): 0 picks a free port.
+    latency (float): Seconds added to every response.
+    jitter (float): Uniform random extra latency, 0..jitter seconds.
+    symbols (int): Coins returned by coins/list/v1 (ids 1..symbols).
+    max_rows (int): Most hourly rows per time-series response (the API caps long windows).
+    null_rate (float): Share of count values sent as null.
+    minute_limit (int): Requests per sliding minute before answering 429, None for no limit.
+    error_rate (float): Share of requests answered with 429 regardless of the limit.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, symbols: int = 100,
+                 max_rows: int = 17520, null_rate: float = 0.05, minute_limit: int | None = None,
+                 error_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.symbols = symbols
+        self.max_rows = max_rows
+        self.null_rate = null_rate
+        self.minute_limit = minute_limit
+        self.error_rate = error_rate
+
+        self.stats = {"requests": 0, "responses_200": 0, "responses_429": 0, "bytes": 0}
+        self._requests = deque()
+        self._bodies = OrderedDict()  # encoded responses, so the mock is not the bottleneck
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = QuietHTTPServer(('127.0.0.1', port), Handler)
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/api4/public"
+
+    def start(self) -> "MockLunarServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-lunar-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _throttled(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._requests and self._requests[0] <= now - 60:
+                self._requests.popleft()
+            if self.error_rate and random.random() < self.error_rate:
+                return True
+            if self.minute_limit is not None and len(self._requests) >= self.minute_limit:
+                return True
+            self._requests.append(now)
+            return False
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.random() * self.jitter)
+
+        if self._throttled():
+            with self._lock:
+                self.stats["responses_429"] += 1
+            self._send(handler, 429, b'{"error": "Too Many Requests"}', extra_headers={'Retry-After': '60'})
+            return
+
+        parts = urlsplit(handler.path)
+        path = [part for part in parts.path.split('/') if part]
+        query = parse_qs(parts.query)
+
+        compressed = 'gzip' in handler.headers.get('Accept-Encoding', '')
+        if path[-3:] == ['coins', 'list', 'v1']:
+            body = self._encoded(('list',), self._coin_list, compressed)
+        elif path[-2:] == ['time-series', 'v2']:
+            symbol_id = int(path[-3])
+            start = int(query.get('start', [0])[0])
+            end = int(query.get('end', [0])[0])
+            body = self._encoded(('series', symbol_id, start, end),
+                                 lambda: self._time_series(symbol_id, start, end), compressed)
+        else:
+            self._send(handler, 404, b'{"error": "Not Found"}')
+            return
+
+        with self._lock:
+            self.stats["responses_200"] += 1
+        self._send(handler, 200, body, extra_headers={'Content-Encoding': 'gzip'} if compressed else None)
+
+    def _send(self, handler, status: int, body: bytes, extra_headers: dict | None = None):
+        headers = {'Content-Type': 'application/json', **(extra_headers or {})}
+        headers['Content-Length'] = str(len(body))
+
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+        with self._lock:
+            self.stats["bytes"] += len(body)
+
+    def _encoded(self, key: tuple, build, compressed: bool) -> bytes:
+        key = key + (compressed,)
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                return body
+        body = json.dumps(build()).encode()
+        if compressed:
+            body = gzip.compress(body, compresslevel=1)
+        with self._lock:
+            self._bodies[key] = body
+            while len(self._bodies) > 256:
+                self._bodies.popitem(last=False)
+        return body
+
+    def _coin_list(self) -> dict:
+        return {"data": [
+            {"id": i, "symbol": f"MOCK{i}", "name": f"Mock coin {i}", "topic": f"mock{i}",
+             "price": 1.0, "market_cap": 1e6}
+            for i in range(1, self.symbols + 1)
+        ]}
+
+    def _time_series(self, symbol_id: int, start: int, end: int) -> dict:
+        first_hour = -(-start // 3600)
+        hours = np.arange(first_hour, end // 3600 + 1)[:self.max_rows]
+        rng = np.random.default_rng(symbol_id * 1_000_003 + first_hour)
+
+        rows = len(hours)
+        columns = {'time': (hours * 3600).tolist()}
+        for field in series_fields:
+            if field in count_fields:
+                values = rng.integers(0, 100_000, rows).tolist()
+                for i in np.flatnonzero(rng.random(rows) < self.null_rate):
+                    values[i] = None
+                columns[field] = values
+            else:
+                columns[field] = np.round(rng.random(rows) * 1000, 6).tolist()
+
+        return {"data": [dict(zip(columns, values)) for values in zip(*columns.values())]}
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    server = MockLunarServer(port=port, latency=0.05, minute_limit=600).start()
+    print(f"Mock LunarCrush at {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
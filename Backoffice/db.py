@@ -0,0 +1,174 @@
+import io
+import threading
+import time
+
+import pandas as pd
+try:
+    # Optional: writes CSV several times faster than pandas
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.pool import QueuePool
+
+from config import connection_string
+
+
+# Connection pool per role: ingestion (landing loop, API logging) and dashboard (Dash reads)
+pool_settings = {
+    "ingestion": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30, "pool_recycle": 1800},
+    "dashboard": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 10, "pool_recycle": 1800},
+}
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long callers wait to check out a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_wait_total += wait
+                self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(role: str = "ingestion") -> Engine:
+    """
+    Returns the process-wide SQLAlchemy engine for a role, creating it on first use.
+
+    Args:
+    role (str): Pool to use, one of the keys of pool_settings ("ingestion" or "dashboard").
+
+    Returns:
+    Engine: Shared engine with a pre-pinged connection pool.
+    """
+    with _engines_lock:
+        engine = _engines.get(role)
+        if engine is None:
+            if role not in pool_settings:
+                raise ValueError(f"Unknown engine role: {role}")
+            engine = create_engine(
+                connection_string,
+                poolclass=TimedQueuePool,
+                pool_pre_ping=True,
+                **pool_settings[role]
+            )
+            _engines[role] = engine
+        return engine
+
+
+def read_pool_stats() -> dict:
+    """
+    Returns connection pool usage for every engine created so far.
+
+    Returns:
+    dict: role -> size, checked_in, checked_out, overflow, checkouts and checkout wait times (seconds).
+    """
+    stats = {}
+    with _engines_lock:
+        engines = dict(_engines)
+
+    for role, engine in engines.items():
+        pool = engine.pool
+        with pool._stats_lock:
+            checkouts = pool.checkouts
+            wait_total = pool.checkout_wait_total
+            wait_max = pool.checkout_wait_max
+        stats[role] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": checkouts,
+            "checkout_wait_avg": wait_total / checkouts if checkouts else 0.0,
+            "checkout_wait_max": wait_max
+        }
+    return stats
+
+
+_integer_columns = {}
+
+
+def read_integer_columns(connection: Connection, table_name: str, schema: str) -> set[str]:
+    """
+    Returns the integer typed columns of a table. Cached per table for the life of the process.
+    """
+    key = (schema, table_name)
+    if key not in _integer_columns:
+        # pg_attribute instead of information_schema so pg_temp tables resolve as well
+        query = text("""
+            SELECT attname
+            FROM pg_attribute
+            WHERE attrelid = to_regclass(:qualified_name)
+              AND attnum > 0 AND NOT attisdropped
+              AND atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+        """)
+        result = connection.execute(query, {'qualified_name': f'"{schema}"."{table_name}"'}).fetchall()
+        _integer_columns[key] = {row[0] for row in result}
+    return _integer_columns[key]
+
+
+def copy_dataframe(connection: Connection, data_df: pd.DataFrame, table_name: str, schema: str = 'landing') -> int:
+    """
+    Bulk loads a DataFrame into a table with COPY FROM STDIN, streaming an in-memory CSV buffer
+    (written by pyarrow when installed). Runs inside the caller's transaction.
+
+    Args:
+    connection (Connection): SQLAlchemy connection on a psycopg2 engine.
+    data_df (pd.DataFrame): Rows to load; column names must match the table.
+    table_name (str): Target table.
+    schema (str): Target schema.
+
+    Returns:
+    int: Number of rows copied.
+    """
+    # Integer columns holding NaN arrive as float ("12.0"), which COPY rejects for integer types
+    integer_columns = [col for col in read_integer_columns(connection, table_name, schema)
+                       if col in data_df.columns and data_df[col].dtype.kind == 'f']
+    if integer_columns:
+        data_df = data_df.astype({col: 'Int64' for col in integer_columns})
+
+    if pa is not None:
+        buffer = io.BytesIO()
+        pa_csv.write_csv(pa.Table.from_pandas(data_df, preserve_index=False), buffer,
+                         pa_csv.WriteOptions(include_header=False))
+    else:
+        buffer = io.StringIO()
+        data_df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    columns = ', '.join(f'"{col}"' for col in data_df.columns)
+    query = f'COPY "{schema}"."{table_name}" ({columns}) FROM STDIN WITH (FORMAT csv)'
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(query, buffer)
+        else:
+            # psycopg 3
+            with cursor.copy(query) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+    return len(data_df)
+
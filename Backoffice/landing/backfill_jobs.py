@@ -0,0 +1,315 @@
+import multiprocessing
+import socket
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db import get_engine, read_pool_stats
+from parquet_mirror import update_partitions, mirror_enabled
+from metrics import get_metrics, record_quota, record_pool_stats
+from rate_limiter import SharedKeyPool
+from lunar_symbols import read_lunar_symbols
+from lunar_data import get_lunar_data, save_lunar_data, build_lunar_data_url
+from lunar_http import get_lunar_client
+from backfill_planner import plan_backfill, save_backfill_window
+
+
+# A job still 'running' after this many seconds belongs to a dead worker and is claimed again
+job_timeout = 15 * 60
+
+# Jobs failing this often stay 'failed' until enqueue_backfill(retry_failed=True)
+max_attempts = 3
+
+# A worker waiting longer than this for quota hands its job back and sleeps
+max_quota_wait = 5 * 60
+
+# Result codes meaning the quota ran out, not that the job is broken: the job is handed back without using an attempt
+quota_result_codes = (429,)
+
+
+def enqueue_backfill(symbols_df: pd.DataFrame | None = None, retry_failed: bool = False) -> tuple[int, int]:
+    """
+    Plans the backfill (plan_backfill) and adds the windows to landing.backfill_jobs.
+    Windows already queued are kept as they are, and a window overlapping a pending or
+    running job of the same symbol is skipped (the last window ends at "now" and moves on
+    every run), so enqueueing again after a crash or with more symbols is safe.
+    Requires staging/backfill_jobs.sql.
+
+    Args:
+    symbols_df (pd.DataFrame): Symbols to plan for, the include_etl symbols when None.
+    retry_failed (bool): Put jobs that ran out of attempts back to pending.
+
+    Returns:
+    Tuple[int, int]: result code (9012 on error) and the number of new jobs.
+    """
+    if symbols_df is None:
+        result_code, symbols_df = read_lunar_symbols()
+        if result_code != 1:
+            return result_code, 0
+        symbols_df = symbols_df[symbols_df['include_etl'] == True]
+
+    result_code, plan_df = plan_backfill(symbols_df.sort_values(by='symbol_id'))
+    if result_code != 1:
+        return result_code, 0
+
+    query = text("""
+        INSERT INTO landing.backfill_jobs (symbol_id, symbol_ticker, start_unix, end_unix, hours_missing)
+        SELECT :symbol_id, :symbol_ticker, :start_unix, :end_unix, :hours_missing
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM landing.backfill_jobs
+            WHERE symbol_id = :symbol_id
+              AND status IN ('pending', 'running')
+              AND start_unix < :end_unix AND end_unix > :start_unix
+        )
+        ON CONFLICT (symbol_id, start_unix, end_unix) DO NOTHING
+    """)
+    columns = ['symbol_id', 'symbol_ticker', 'start_unix', 'end_unix', 'hours_missing']
+    try:
+        engine = get_engine("ingestion")
+        with engine.begin() as connection:
+            added = 0
+            if not plan_df.empty:
+                records = plan_df[columns].astype({'symbol_id': int, 'start_unix': int, 'end_unix': int, 'hours_missing': int})
+                added = connection.execute(query, records.to_dict('records')).rowcount
+            if retry_failed:
+                connection.execute(text("UPDATE landing.backfill_jobs SET status = 'pending', attempts = 0 WHERE status = 'failed'"))
+        return 1, added
+    except Exception as e:
+        print(f"Error enqueueing backfill jobs: {e}")
+        return 9012, 0
+
+
+def claim_job(worker: str) -> dict | None:
+    """
+    Claims the next pending job, or one whose worker stopped before job_timeout.
+    SKIP LOCKED lets any number of workers claim at the same time without waiting on each other.
+    finish_job never runs for a job that kills its worker (OOM, segfault), so stale jobs
+    that already used max_attempts are marked failed here instead of being claimed again.
+
+    Returns:
+    dict | None: The job row, None when nothing is left to do.
+    """
+    fail_stale = text("""
+        UPDATE landing.backfill_jobs
+        SET status = 'failed', finished_at = :now
+        WHERE job_id IN (
+            SELECT job_id
+            FROM landing.backfill_jobs
+            WHERE status = 'running' AND claimed_at < :stale_before AND attempts >= :max_attempts
+            FOR UPDATE SKIP LOCKED
+        )
+    """)
+    query = text("""
+        UPDATE landing.backfill_jobs
+        SET status = 'running', worker = :worker, claimed_at = :now, attempts = attempts + 1
+        WHERE job_id = (
+            SELECT job_id
+            FROM landing.backfill_jobs
+            WHERE status = 'pending'
+               OR (status = 'running' AND claimed_at < :stale_before AND attempts < :max_attempts)
+            ORDER BY symbol_id, start_unix
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING job_id, symbol_id, symbol_ticker, start_unix, end_unix, attempts
+    """)
+    now = datetime.now()
+    params = {'worker': worker, 'now': now, 'stale_before': now - pd.Timedelta(seconds=job_timeout),
+              'max_attempts': max_attempts}
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(fail_stale, params)
+        row = connection.execute(query, params).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def finish_job(job: dict, result_code: int, rows: int = 0) -> None:
+    """
+    Marks a job done (result 1 or 2), hands it back as pending (network errors)
+    or marks it failed after max_attempts. Quota results go to release_job instead.
+    """
+    if result_code in (1, 2):
+        status = 'done'
+    elif job['attempts'] >= max_attempts:
+        status = 'failed'
+    else:
+        status = 'pending'
+
+    query = text("""
+        UPDATE landing.backfill_jobs
+        SET status = :status, finished_at = :now, rows = :rows, result_code = :result_code
+        WHERE job_id = :job_id
+    """)
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(query, {'status': status, 'now': datetime.now(), 'rows': int(rows),
+                                   'result_code': int(result_code), 'job_id': job['job_id']})
+
+
+def release_job(job: dict) -> None:
+    """
+    Hands a job back untouched, e.g. when the quota is spent for longer than max_quota_wait
+    or the API answered with one of quota_result_codes.
+    """
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(text("""
+            UPDATE landing.backfill_jobs
+            SET status = 'pending', attempts = attempts - 1
+            WHERE job_id = :job_id
+        """), {'job_id': job['job_id']})
+
+
+def acquire_quota(pool: SharedKeyPool, url: str) -> float:
+    """
+    Waits for a request slot, at most max_quota_wait.
+
+    Returns:
+    float: 0.0 when the slot was granted, otherwise the seconds until the next one.
+    """
+    start = time.perf_counter()
+    while (wait := pool.try_acquire(url, "backfill_worker")) > 0:
+        if wait > max_quota_wait:
+            return wait
+        time.sleep(wait)
+    get_metrics().observe("landing_stage_seconds", time.perf_counter() - start, stage="limiter_wait")
+    return 0.0
+
+
+def run_job(job: dict) -> tuple[int, int]:
+    """
+    Fetches one window, merges it straight into landing.lunar_data and records it in
+    landing.backfill_windows. The merge is idempotent, a job that is run twice changes nothing.
+
+    Returns:
+    Tuple[int, int]: result code (get_lunar_data's, or save_lunar_data's when saving failed) and rows.
+    """
+    metrics = get_metrics()
+    symbol_id = int(job['symbol_id'])
+    start_time = datetime.fromtimestamp(job['start_unix']).strftime("%d.%m.%Y %H:%M")
+    end_time = datetime.fromtimestamp(job['end_unix']).strftime("%d.%m.%Y %H:%M")
+
+    result_code, data_df = get_lunar_data(symbol_id, start_time, end_time)
+    metrics.inc("landing_results_total", stage="get", code=result_code)
+    if result_code not in (1, 2):
+        return result_code, 0
+
+    rows = len(data_df)
+    metrics.inc("landing_rows_total", rows, stage="fetched")
+    if rows:
+        with metrics.timer("landing_stage_seconds", stage="save"):
+            save_result_code, save_message = save_lunar_data(data_df, merge=True)
+        metrics.inc("landing_results_total", stage="save", code=save_result_code)
+        if save_result_code != 1:
+            print(f"{symbol_id} | save failed: {save_message}")
+            return save_result_code, 0
+        metrics.inc("landing_rows_total", rows, stage="saved")
+        if mirror_enabled:
+            update_partitions(data_df)
+
+    save_backfill_window(symbol_id, job['start_unix'], job['end_unix'], rows)
+    return result_code, rows
+
+
+def run_worker(worker: str | None = None, limits: dict | None = None) -> int:
+    """
+    Claims and runs jobs until none are left. Any number of workers, in any number of
+    processes or hosts, can run against the same database: jobs are claimed with
+    SKIP LOCKED and the API quota is shared through api_request_logs (SharedKeyPool).
+
+    Args:
+    worker (str): Name recorded on claimed jobs, host:pid by default.
+    limits (dict): minute_limit / hour_limit / day_limit per key, the KeyPool defaults when None.
+
+    Returns:
+    int: Number of jobs finished by this worker.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    pool = SharedKeyPool(**(limits or {}))
+    client = get_lunar_client()
+    metrics = get_metrics()
+    pool.seed()
+
+    finished = 0
+    while True:
+        job = claim_job(worker)
+        if job is None:
+            print(f"{worker} | no jobs left, {finished} done")
+            return finished
+
+        url = build_lunar_data_url(job['symbol_id'], datetime.fromtimestamp(job['start_unix']).strftime("%d.%m.%Y %H:%M"),
+                                   datetime.fromtimestamp(job['end_unix']).strftime("%d.%m.%Y %H:%M"))
+
+        # Cached windows cost no quota
+        if not client.cache.replay and not client.is_cached(url):
+            wait = acquire_quota(pool, url)
+            if wait > 0:
+                release_job(job)
+                print(f"{worker} | quota spent, sleeping {wait:.0f} seconds")
+                time.sleep(wait)
+                continue
+
+        start = time.perf_counter()
+        result_code, rows = run_job(job)
+        if result_code in quota_result_codes:
+            release_job(job)
+            wait = max(pool.wait_time(), 1.0)
+            print(f"{worker} | {job['symbol_id']} | code: {result_code}, sleeping {wait:.0f} seconds")
+            time.sleep(wait)
+            continue
+        finish_job(job, result_code, rows)
+        finished += 1
+        print(f"{worker} | {job['symbol_id']} | {job['symbol_ticker']} | {job['start_unix']}:{job['end_unix']} | "
+              f"code: {result_code} | #{rows} | {time.perf_counter() - start:.2f} sec")
+
+        record_quota(pool)
+        record_pool_stats(read_pool_stats())
+        metrics.write()
+
+
+def run_workers(workers: int, limits: dict | None = None) -> None:
+    """
+    Enqueues the backfill and runs it with workers local processes. More workers can
+    join from other hosts with: python backfill_jobs.py --worker
+    """
+    result_code, added = enqueue_backfill()
+    print(f"Backfill jobs added: {added} (code {result_code})")
+
+    # spawn: every worker opens its own connections instead of inheriting the parent's
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, kwargs={'limits': limits}, name=f"backfill-{i}")
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def read_job_status() -> pd.DataFrame:
+    """
+    Returns the number of jobs, hours and rows per status.
+    """
+    engine = get_engine("ingestion")
+    with engine.connect() as connection:
+        return pd.read_sql_query("""
+            SELECT status, count(*) AS jobs, sum(hours_missing) AS hours_missing, sum(rows) AS rows
+            FROM landing.backfill_jobs
+            GROUP BY status
+            ORDER BY status
+        """, connection)
+
+
+if __name__ == "__main__":
+    # python backfill_jobs.py --enqueue [--retry-failed] | --worker | --status
+    if "--enqueue" in sys.argv:
+        print(enqueue_backfill(retry_failed="--retry-failed" in sys.argv))
+    elif "--worker" in sys.argv:
+        run_worker()
+    else:
+        print(read_job_status())
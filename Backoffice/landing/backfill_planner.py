@@ -0,0 +1,196 @@
+import math
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db import get_engine
+
+
+# Earliest hour the backfill looks at
+history_start = "01.01.2016 00:00"
+
+# One time-series/v2 call returns at most ~2 years of hourly buckets
+max_hours_per_request = 2 * 365 * 24
+
+# Fetched windows younger than this are not recorded, the API may still fill them in
+settle_hours = 24
+
+
+def read_coverage(symbol_ids: list[int]) -> dict[int, list[tuple[int, int]]]:
+    """
+    Builds the coverage index: for every symbol, the runs of consecutive hourly buckets
+    already loaded into landing.lunar_data plus the windows already fetched from the API
+    (landing.backfill_windows), including the ones that came back empty.
+
+    Args:
+    symbol_ids (list[int]): Symbols to read.
+
+    Returns:
+    dict[int, list[tuple[int, int]]]: symbol_id -> sorted, merged (first_hour, last_hour) ranges,
+    where hour = time_unix // 3600.
+    """
+    query = text("""
+        WITH hours AS (
+            SELECT symbol_id, time_unix / 3600 AS hour
+            FROM landing.lunar_data
+            WHERE symbol_id = ANY(:symbol_ids)
+        ),
+        islands AS (
+            -- Consecutive hours share the same hour - row_number()
+            SELECT symbol_id, min(hour) AS first_hour, max(hour) AS last_hour
+            FROM (
+                SELECT symbol_id, hour, hour - row_number() OVER (PARTITION BY symbol_id ORDER BY hour) AS island
+                FROM hours
+            ) h
+            GROUP BY symbol_id, island
+        )
+        SELECT symbol_id, first_hour, last_hour FROM islands
+        UNION ALL
+        SELECT symbol_id, start_unix / 3600, end_unix / 3600
+        FROM landing.backfill_windows
+        WHERE symbol_id = ANY(:symbol_ids)
+        ORDER BY symbol_id, first_hour
+    """)
+
+    engine = get_engine("ingestion")
+    with engine.connect() as connection:
+        result = connection.execute(query, {'symbol_ids': [int(symbol_id) for symbol_id in symbol_ids]}).fetchall()
+
+    coverage = {int(symbol_id): [] for symbol_id in symbol_ids}
+    for symbol_id, first_hour, last_hour in result:
+        ranges = coverage[symbol_id]
+        if ranges and first_hour <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], int(last_hour)))
+        else:
+            ranges.append((int(first_hour), int(last_hour)))
+    return coverage
+
+
+def find_gaps(first_hour: int, last_hour: int, covered: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """
+    Returns the hour ranges between first_hour and last_hour (inclusive) that are not covered.
+    """
+    gaps = []
+    cursor = first_hour
+    for start, end in covered:
+        if end < cursor:
+            continue
+        if start > last_hour:
+            break
+        if start > cursor:
+            gaps.append((cursor, start - 1))
+        cursor = end + 1
+    if cursor <= last_hour:
+        gaps.append((cursor, last_hour))
+    return gaps
+
+
+def cover_gaps(gaps: list[tuple[int, int]], max_hours: int) -> list[tuple[int, int]]:
+    """
+    Returns the fewest request windows of at most max_hours that cover all gaps.
+    Greedy: each window starts at the first uncovered hour and spans as far as allowed.
+    """
+    requests = []
+    for start, end in gaps:
+        while start <= end:
+            if requests and start <= requests[-1][0] + max_hours - 1:
+                # The previous window can reach this gap, stretch it
+                window_start = requests[-1][0]
+                window_end = min(end, window_start + max_hours - 1)
+                requests[-1] = (window_start, window_end)
+            else:
+                window_end = min(end, start + max_hours - 1)
+                requests.append((start, window_end))
+            start = window_end + 1
+    return requests
+
+
+def plan_backfill(symbols_df: pd.DataFrame, start_time: str = history_start, end_time: str | None = None,
+                  max_hours: int = max_hours_per_request) -> tuple[int, pd.DataFrame]:
+    """
+    Plans the minimal set of get_lunar_data calls that fills the gaps between start_time
+    and end_time for every symbol.
+
+    Args:
+    symbols_df (pd.DataFrame): Symbols to plan for, with symbol_id and symbol_ticker columns.
+    start_time (str): Start date in the format "dd.mm.yyyy hh:mm".
+    end_time (str): End date in the format "dd.mm.yyyy hh:mm". Defaults to the current hour.
+    max_hours (int): Maximum hourly buckets per request.
+
+    Returns:
+    Tuple[int, pd.DataFrame]: result code and the plan, one row per request, ordered by symbol_id and time.
+    """
+    first_hour = int(datetime.strptime(start_time, "%d.%m.%Y %H:%M").timestamp()) // 3600
+    if end_time is None:
+        last_hour = int(datetime.now().timestamp()) // 3600
+    else:
+        last_hour = int(datetime.strptime(end_time, "%d.%m.%Y %H:%M").timestamp()) // 3600
+
+    try:
+        coverage = read_coverage(symbols_df['symbol_id'].tolist())
+    except Exception as e:
+        print(f"Error reading backfill coverage: {e}")
+        return 9007, pd.DataFrame()
+
+    plan = []
+    for row in symbols_df.itertuples(index=False):
+        symbol_id = int(row.symbol_id)
+        gaps = find_gaps(first_hour, last_hour, coverage[symbol_id])
+        for window_start, window_end in cover_gaps(gaps, max_hours):
+            missing = sum(min(end, window_end) - max(start, window_start) + 1
+                          for start, end in gaps if start <= window_end and end >= window_start)
+            plan.append({
+                'symbol_id': symbol_id,
+                'symbol_ticker': row.symbol_ticker,
+                'start_unix': window_start * 3600,
+                'end_unix': window_end * 3600,
+                'start_time': datetime.fromtimestamp(window_start * 3600).strftime("%d.%m.%Y %H:%M"),
+                'end_time': datetime.fromtimestamp(window_end * 3600).strftime("%d.%m.%Y %H:%M"),
+                'hours_missing': missing
+            })
+
+    columns = ['symbol_id', 'symbol_ticker', 'start_unix', 'end_unix', 'start_time', 'end_time', 'hours_missing']
+    return 1, pd.DataFrame(plan, columns=columns)
+
+
+def print_backfill_plan(plan_df: pd.DataFrame, minute_limit: int | None = 10, day_limit: int | None = 2000) -> None:
+    """
+    Prints the plan and its quota cost without spending any API calls.
+    """
+    calls = len(plan_df)
+    for row in plan_df.itertuples(index=False):
+        print(f"{row.symbol_id} | {row.symbol_ticker} | {row.start_time} - {row.end_time} | missing: {row.hours_missing} h")
+
+    print(f"Symbols: {plan_df['symbol_id'].nunique()} | calls: {calls} | missing hours: {plan_df['hours_missing'].sum()}")
+    if minute_limit:
+        print(f"Minimum time at {minute_limit}/minute: {calls / minute_limit:.1f} min")
+    if day_limit:
+        print(f"Daily quota: {calls}/{day_limit} ({math.ceil(calls / day_limit)} day(s))")
+
+
+def save_backfill_window(symbol_id: int, start_unix: int, end_unix: int, rows: int) -> None:
+    """
+    Records a fetched window in landing.backfill_windows so it is never planned again,
+    even when the API returned nothing (e.g. before the coin existed).
+    Windows ending within the last settle_hours are skipped.
+    """
+    if end_unix > datetime.now().timestamp() - settle_hours * 3600:
+        return
+
+    query = text("""
+        INSERT INTO landing.backfill_windows (symbol_id, start_unix, end_unix, rows, fetched_at)
+        VALUES (:symbol_id, :start_unix, :end_unix, :rows, :fetched_at)
+    """)
+    engine = get_engine("ingestion")
+    with engine.begin() as connection:
+        connection.execute(query, {
+            'symbol_id': int(symbol_id),
+            'start_unix': int(start_unix),
+            'end_unix': int(end_unix),
+            'rows': int(rows),
+            'fetched_at': datetime.now()
+        })
@@ -1,3 +1,4 @@
+import asyncio
 import time
 from datetime import datetime, timedelta, timezone
 import pandas as pd
@@ -5,156 +6,245 @@ import pandas as pd
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils import read_key_usage, dump_lunar_buffer
-from config import lunar_key
+from utils import dump_lunar_buffer
+from parquet_mirror import update_partitions, mirror_enabled
+from db import read_pool_stats
+from metrics import get_metrics, record_quota, record_pool_stats, start_metrics_server
+from rate_limiter import KeyPool
 
 
 from lunar_symbols import read_lunar_symbols
-from lunar_data import get_lunar_data, save_lunar_data
+from lunar_data import get_lunar_data, save_lunar_data, build_lunar_data_url
+from lunar_http import get_lunar_client
+from lunar_client import AsyncLunarClient
+from backfill_planner import plan_backfill, print_backfill_plan, save_backfill_window
+from symbol_scheduler import read_symbol_activity, rank_symbols, select_symbols, log_schedule, record_attempts
+from backfill_jobs import run_workers
 
 
+# Quota of every LunarCrush key used for landing (config.lunar_key entries may override it)
+lunar_limits = {"minute_limit": 10, "hour_limit": None, "day_limit": 2000}
 
-def landing_process():
+# LunarCrush publishes hourly buckets: one ETL round per cycle, each spending at most
+# cycle_seconds / 86400 of the day quota, so the quota lasts the whole (sliding) day
+cycle_seconds = 3600
 
-    key_usage = read_key_usage()
 
-    time_pairs = [
-        ("01.01.2016", "31.12.2017"), 
-        ("01.01.2018", "31.12.2019"),
-        ("01.01.2020", "31.12.2021"),
-        ("01.01.2022", "31.12.2023"),
-        ("01.01.2024", "31.12.2025")
-    ]
+def seconds_to_next_cycle() -> float:
+    """
+    Seconds until a minute after the next cycle starts, when the new hourly bucket is published.
+    """
+    return cycle_seconds - time.time() % cycle_seconds + 60
+
+
+def landing_process(dry_run: bool = False):
 
     result_code, symbols_df = read_lunar_symbols()
     symbols_df = symbols_df.sort_values(by='symbol_id', ascending=True)
     
     symbols_df = symbols_df[symbols_df['include_etl'] == True]
 
-    for index, row in symbols_df.iterrows():
-        symbol_id = row['symbol_id']
-        symbol_ticker = row['symbol_ticker']
-
-        # Check key_usage limits
-        if key_usage["key_outlook"]["minute"] >= 10:
-            print("Minute limit reached. Waiting 5 seconds.")
-            time.sleep(5)
-            key_usage = read_key_usage()
-            continue
-
-        if key_usage["key_outlook"]["day"] >= 2000:
-            print("Daily limit reached. Waiting 1 hour.")
-            time.sleep(3600)
-            key_usage = read_key_usage()
-            continue
-
-        # Loop through each pair of start_time and end_time
-        for start_time, end_time in time_pairs:
+    # Only request the windows that are missing from landing.lunar_data
+    result_code, plan_df = plan_backfill(symbols_df)
+    if result_code != 1:
+        return
+
+    # One limiter per key, every request goes out with the key that has the most headroom
+    limiter = KeyPool(**lunar_limits)
+
+    if dry_run:
+        print_backfill_plan(plan_df, limiter.limits["minute"], limiter.limits["day"])
+        return
+
+    metrics = get_metrics()
+    client = get_lunar_client()
+    if not client.cache.replay:
+        limiter.seed()
+
+    for symbol_id, symbol_plan in plan_df.groupby('symbol_id', sort=False):
+        saved_frames = []  # written to the mirror once the buffer is merged
+        for row in symbol_plan.itertuples(index=False):
+            symbol_ticker = row.symbol_ticker
+            start_time, end_time = row.start_time, row.end_time
+
+            # Wait exactly until the minute/hour/day windows have a free slot, cached windows cost no quota
+            time0 = 0.0
+            if not client.cache.replay and not client.is_cached(build_lunar_data_url(symbol_id, start_time, end_time)):
+                time0 = limiter.acquire()
+                metrics.observe("landing_stage_seconds", time0, stage="limiter_wait")
+
             # Measure time for get_lunar_data
             start_time_get = time.time()
             result_code, data_df = get_lunar_data(symbol_id, start_time, end_time)
             time1 = time.time() - start_time_get
             len_data_df = len(data_df) if not data_df.empty else 0
+            metrics.inc("landing_results_total", stage="get", code=result_code)
+            metrics.inc("landing_rows_total", len_data_df, stage="fetched")
+            record_quota(limiter)
 
-            print(f"{symbol_id} | {symbol_ticker} | {start_time}:{end_time} | #{len_data_df} | {key_usage['key_outlook']['minute']}/10 & {key_usage['key_outlook']['day']}/2000")
+            usage = limiter.usage()
+            print(f"{symbol_id} | {symbol_ticker} | {start_time}:{end_time} | #{len_data_df} | {usage['minute']}/{limiter.limits['minute']} & {usage['day']}/{limiter.limits['day']}")
 
             # Measure time for save_lunar_data
             start_time_save = time.time()
+            save_result_code = result_code
             if not data_df.empty:
                 save_result_code, save_message = save_lunar_data(data_df)
+                metrics.observe("landing_stage_seconds", time.time() - start_time_save, stage="save")
+                metrics.inc("landing_results_total", stage="save", code=save_result_code)
+                if save_result_code == 1:
+                    metrics.inc("landing_rows_total", len_data_df, stage="saved")
+                    if mirror_enabled:
+                        saved_frames.append(data_df)
             #    print(f"Data saved for {symbol_ticker} ({symbol_id}) from {start_time} to {end_time}: {save_message}")
             #else:
             #    print(f"No data returned for {symbol_ticker} ({symbol_id}) from {start_time} to {end_time}. Skipping save.")
             time2 = time.time() - start_time_save
 
-            # Measure time for read_key_usage
-            start_time_read = time.time()
-            key_usage = read_key_usage()
-            time3 = time.time() - start_time_read
+            # Remember the window, also when it was empty, so it is not planned again
+            if result_code == 2 or (result_code == 1 and save_result_code == 1):
+                save_backfill_window(symbol_id, row.start_unix, row.end_unix, len_data_df)
 
             # Print timing information
-            time_total = time1+time2+time3
-            print(f"{symbol_id} | get: {time1:.3f} | save: {time2:.3f} | read: {time3:.3f} | total: {time_total:.3f}")
-            
-            if time_total < 45:
-                time.sleep(45-time_total+1)
+            time_total = time0+time1+time2
+            print(f"{symbol_id} | wait: {time0:.3f} | get: {time1:.3f} | save: {time2:.3f} | total: {time_total:.3f}")
 
 
-        # After processing all time pairs for the current symbol_id, dump the buffer
-        dump_lunar_buffer()
+        # After processing all planned windows for the current symbol_id, dump the buffer
+        dump_result_code, report = dump_lunar_buffer()
+        metrics.inc("landing_results_total", stage="dump", code=dump_result_code)
+        if dump_result_code == 1:
+            metrics.observe("landing_stage_seconds", report['elapsed_time'], stage="dump")
+            for stage in ('inserted', 'updated', 'skipped'):
+                metrics.inc("landing_rows_total", report[stage], stage=stage)
+            print(f"🔄️ {symbol_id} | dump: {report['elapsed_time']:.2f} sec | inserted: {report['inserted']} | updated: {report['updated']} | skipped: {report['skipped']}")
 
+            # Write the merged rows into their mirror partitions, no read back from Postgres
+            if saved_frames and (report['inserted'] or report['updated']):
+                update_partitions(pd.concat(saved_frames, ignore_index=True))
 
-def landing_process_etl():
-    key_usage = read_key_usage()
+        record_pool_stats(read_pool_stats())
+        metrics.write()
 
+
+async def landing_process_etl_async(max_concurrency: int = 5, budget: int | None = None, watch_weights: dict | None = None):
     result_code, symbols_df = read_lunar_symbols()
-    symbols_df = symbols_df.sort_values(by='last_update', ascending=True)
     symbols_df = symbols_df[symbols_df['include_etl'] == True]
-    n = len(symbols_df)
-
-    for i, (index, row) in enumerate(symbols_df.iterrows(), start=1):  # start=1 for 1-based index
-        symbol_id = row['symbol_id']
-        symbol_ticker = row['symbol_ticker']
-
-        # Check key_usage limits
-        if key_usage["key_outlook"]["minute"] >= 10:
-            print("Minute limit reached. Waiting 5 seconds.")
-            time.sleep(5)
-            key_usage = read_key_usage()
-            continue
-
-        if key_usage["key_outlook"]["day"] >= 2000:
-            print("Daily limit reached. Waiting 1 hour.")
-            time.sleep(3600)
-            key_usage = read_key_usage()
-            continue
-
-        # Get the last timestamp from the DataFrame
-        last_timestamp = row['last_timestamp']
-        start_time = datetime.fromtimestamp(last_timestamp).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-        end_time = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-
-
-        # Format the start_time and end_time as "%d.%m.%Y %H:%M" before passing to get_lunar_data
-        start_time_str = start_time.strftime("%d.%m.%Y %H:%M")
-        end_time_str = end_time.strftime("%d.%m.%Y %H:%M")
-
-        # Measure time for get_lunar_data
-        start_time_get = time.time()
-        result_code, data_df = get_lunar_data(
-            symbol_id, 
-            start_time_str,  # Pass formatted string
-            end_time_str  # Pass formatted string
-        )
-      
-        time1 = time.time() - start_time_get
-        len_data_df = len(data_df) if not data_df.empty else 0
-
-        print(f"{i}/{n} | {symbol_id} | {symbol_ticker} | {start_time_str} - {end_time_str} | #{len_data_df} | {key_usage['key_outlook']['minute']}/10 & {key_usage['key_outlook']['day']}/2000")
-
-        # Measure time for save_lunar_data
-        start_time_save = time.time()
-        if not data_df.empty:
-            save_result_code, save_message = save_lunar_data(data_df)
-        time2 = time.time() - start_time_save
-
-        # Measure time for read_key_usage
-        start_time_read = time.time()
-        key_usage = read_key_usage()
-        time3 = time.time() - start_time_read
-
-        # Print timing information
-        time_total = time1 + time2 + time3
-        print(f"{symbol_id} | get: {time1:.3f} | save: {time2:.3f} | read: {time3:.3f} | total: {time_total:.3f}")
-
-        dump_lunar_buffer()
-
-        if time_total < 45:
-            time.sleep(45 - time_total)
-
-        
+
+    metrics = get_metrics()
+    limiter = KeyPool(**lunar_limits)
+
+    async with AsyncLunarClient(max_concurrency=max_concurrency, limiter=limiter) as client:
+
+        # Spend this cycle's share of the day quota, capped by what is left of it, on the
+        # symbols where fresh data is worth the most
+        if budget is None and limiter.limits['day'] is not None:
+            cycle_budget = -(-limiter.limits['day'] * cycle_seconds // 86400)
+            budget = max(min(cycle_budget, limiter.limits['day'] - limiter.usage()['day']), 0)
+
+        activity_result_code, activity_df = read_symbol_activity()
+        if activity_result_code != 1:
+            activity_df = pd.DataFrame(columns=['symbol_id', 'posts_created', 'interactions', 'social_dominance', 'interactions_24h'])
+
+        ranked_df = rank_symbols(symbols_df, activity_df, watch_weights)
+        symbols_df = select_symbols(ranked_df, budget)
+        log_schedule(ranked_df, symbols_df)
+        n = len(symbols_df)
+
+        if n == 0:
+            # Nothing new before the next hourly bucket
+            wait = seconds_to_next_cycle()
+            print(f"Nothing to refresh. Waiting {wait:.0f} seconds.")
+            await asyncio.sleep(wait)
+            return
+
+        async def process_symbol(i, row):
+            symbol_id = row['symbol_id']
+            symbol_ticker = row['symbol_ticker']
+            print(f"{i}/{n} | {symbol_id} | {symbol_ticker} | score: {row['score']:.3f} | stale: {row['hours_stale']:.0f} h | activity: {row['activity']:.2f}")
+
+            # Get the last timestamp from the DataFrame
+            last_timestamp = row['last_timestamp']
+            start_time = datetime.fromtimestamp(last_timestamp).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+            end_time = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+            # No complete hour after last_timestamp yet, nothing to ask for
+            if start_time >= end_time:
+                return 2
+
+            # Format the start_time and end_time as "%d.%m.%Y %H:%M" before passing to get_lunar_data
+            start_time_str = start_time.strftime("%d.%m.%Y %H:%M")
+            end_time_str = end_time.strftime("%d.%m.%Y %H:%M")
+
+            # Measure time for get_lunar_data
+            start_time_get = time.time()
+            result_code, data_df = await client.get_lunar_data(symbol_id, start_time_str, end_time_str)
+            time1 = time.time() - start_time_get
+
+            metrics.inc("landing_results_total", stage="get", code=result_code)
+            if result_code in (9002, 9009):
+                return result_code
+
+            len_data_df = len(data_df) if not data_df.empty else 0
+            metrics.inc("landing_rows_total", len_data_df, stage="fetched")
+            usage = limiter.usage()
+            print(f"{i}/{n} | {symbol_id} | {symbol_ticker} | {start_time_str} - {end_time_str} | #{len_data_df} | {usage['minute']}/{limiter.limits['minute']} & {usage['day']}/{limiter.limits['day']}")
+
+            # Measure time for save_lunar_data, merged straight into landing.lunar_data
+            start_time_save = time.time()
+            save_message = "No data."
+            if not data_df.empty:
+                save_result_code, save_message = await asyncio.to_thread(save_lunar_data, data_df, merge=True)
+                metrics.observe("landing_stage_seconds", time.time() - start_time_save, stage="save")
+                metrics.inc("landing_results_total", stage="save", code=save_result_code)
+                if save_result_code == 1:
+                    metrics.inc("landing_rows_total", len_data_df, stage="saved")
+                if save_result_code == 1 and mirror_enabled:
+                    await asyncio.to_thread(update_partitions, data_df)
+            time2 = time.time() - start_time_save
+
+            print(f"{symbol_id} | get: {time1:.3f} | save: {time2:.3f} | total: {time1 + time2:.3f} | {save_message}")
+            return result_code
+
+        result_codes = await asyncio.gather(*(
+            process_symbol(i, row) for i, (index, row) in enumerate(symbols_df.iterrows(), start=1)  # start=1 for 1-based index
+        ))
+
+        # Answered fetches count as attempts also without new rows, see rank_symbols
+        record_attempts([row['symbol_id'] for (index, row), result_code in zip(symbols_df.iterrows(), result_codes)
+                         if result_code in (1, 2)])
+
+        record_quota(limiter)
+        record_pool_stats(read_pool_stats())
+        metrics.write()
+
+    # The next round starts with the next cycle (later when the day quota ran out), not right away
+    wait = seconds_to_next_cycle()
+    if 9002 in result_codes:
+        wait = max(wait, limiter.wait_time())
+        print(f"Daily limit reached. Waiting {wait:.0f} seconds.")
+    else:
+        print(f"Round done. Waiting {wait:.0f} seconds for the next cycle.")
+    await asyncio.sleep(wait)
+
+
+def landing_process_etl(budget: int | None = None, watch_weights: dict | None = None):
+    asyncio.run(landing_process_etl_async(budget=budget, watch_weights=watch_weights))
+
 
 if __name__ == "__main__":
+    # LANDING_METRICS_PORT=9108 serves /metrics, the file sink is always written
+    start_metrics_server()
+
+    # python landing_process.py --backfill [--dry-run] [--workers N]
+    if "--backfill" in sys.argv:
+        if "--workers" in sys.argv and "--dry-run" not in sys.argv:
+            # Sharded over N processes through landing.backfill_jobs, see backfill_jobs.py
+            run_workers(int(sys.argv[sys.argv.index("--workers") + 1]), lunar_limits)
+        else:
+            landing_process(dry_run="--dry-run" in sys.argv)
+        sys.exit()
+
     try:
         while True:  # Continuous loop until manually stopped
             landing_process_etl()
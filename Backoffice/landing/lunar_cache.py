@@ -0,0 +1,181 @@
+import gzip
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+
+
+# Opt-in. off: always call the API, on: serve fresh cache entries and store responses, replay: cache only, no network
+cache_mode = os.environ.get("LUNAR_CACHE", "off")
+
+# Outside the source tree, the cache grows up to max_bytes
+cache_dir = os.environ.get("LUNAR_CACHE_DIR", os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "lunar_responses"))
+
+cache_settings = {
+    "max_bytes": 2 * 1024 ** 3,     # evict least recently used files above this size
+    "ttl_recent": 5 * 60,           # time-series windows that may still change
+    "ttl_symbols": 24 * 3600,       # coins/list/v1
+    "immutable_after": 48 * 3600,   # windows ending this long ago never change, no TTL
+}
+
+
+def cache_key(url: str) -> str:
+    """
+    Maps a LunarCrush URL to a readable file name: symbol and window for time-series, endpoint otherwise.
+    """
+    parts = urlsplit(url)
+    path = [part for part in parts.path.split('/') if part]
+    query = parse_qs(parts.query)
+
+    if 'time-series' in path:
+        symbol_id = path[path.index('coins') + 1]
+        bucket = query.get('bucket', ['hour'])[0]
+        start = query.get('start', [''])[0]
+        end = query.get('end', [''])[0]
+        return f"time-series_{symbol_id}_{bucket}_{start}_{end}.json.gz"
+
+    return '_'.join(path[-3:]) + ".json.gz"
+
+
+def cache_ttl(url: str, now: float | None = None) -> float | None:
+    """
+    Returns how long a response stays valid in seconds, None when it never expires.
+    """
+    if now is None:
+        now = time.time()
+
+    query = parse_qs(urlsplit(url).query)
+    if 'end' in query:
+        if int(query['end'][0]) < now - cache_settings["immutable_after"]:
+            return None
+        return cache_settings["ttl_recent"]
+    return cache_settings["ttl_symbols"]
+
+
+class LunarCache:
+    """
+    On-disk cache of raw LunarCrush responses, one gzip file per URL key.
+
+    Historical time-series windows never expire, recent windows and the coin list
+    have a TTL (measured from the file's modification time). When the directory grows
+    above max_bytes the least recently used files (by access time) are removed.
+    """
+
+    def __init__(self, path: str = cache_dir, mode: str = cache_mode, max_bytes: int = cache_settings["max_bytes"]):
+        if mode not in ("off", "on", "replay"):
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk, computed by the first evict()
+        if self.enabled:
+            os.makedirs(self.path, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def _file(self, url: str) -> str:
+        return os.path.join(self.path, cache_key(url))
+
+    def _expired(self, url: str, modified: float) -> bool:
+        # Replay mode ignores TTLs, anything on disk is served
+        ttl = cache_ttl(url)
+        return not self.replay and ttl is not None and time.time() - modified > ttl
+
+    def contains(self, url: str) -> bool:
+        """
+        True when a fresh entry for url is on disk. Only stats the file, the body is not read.
+        """
+        if not self.enabled:
+            return False
+        try:
+            return not self._expired(url, os.path.getmtime(self._file(url)))
+        except OSError:
+            return False
+
+    def get(self, url: str, count: bool = True) -> bytes | None:
+        """
+        Returns the cached body for url, or None when missing or expired.
+        """
+        if not self.enabled:
+            return None
+
+        file = self._file(url)
+        try:
+            modified = os.path.getmtime(file)
+            if self._expired(url, modified):
+                raise FileNotFoundError(file)
+            with gzip.open(file, 'rb') as f:
+                body = f.read()
+            # The access time marks recent use for eviction, the modification time keeps the age for the TTL
+            os.utime(file, (time.time(), modified))
+        except (FileNotFoundError, OSError, EOFError):
+            if count:
+                self.misses += 1
+            return None
+
+        if count:
+            self.hits += 1
+        return body
+
+    def put(self, url: str, body: bytes) -> None:
+        """
+        Stores a response body and evicts old files if the cache is over max_bytes.
+        """
+        if not self.enabled:
+            return
+
+        file = self._file(url)
+        temp_file = f"{file}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_file, 'wb', compresslevel=1) as f:
+            f.write(body)
+        size = os.path.getsize(temp_file)
+
+        with self._lock:
+            # An overwritten entry gives its old size back
+            try:
+                old_size = os.path.getsize(file)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(temp_file, file)  # atomic, readers never see a partial file
+            if self._size is not None:
+                self._size += size - old_size
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Removes least recently used files until the cache fits in max_bytes. Returns the number removed.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.path):
+                if entry.is_file() and entry.name.endswith('.json.gz'):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            removed = 0
+            for accessed, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+
+            self._size = total
+            return removed
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from contextvars import ContextVar
+
+import aiohttp
+import pandas as pd
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import lunar_key
+from utils import register_api_request
+from rate_limiter import RateLimiter, KeyPool
+from lunar_data import build_lunar_data_url, parse_lunar_data
+from lunar_http import json_loads, accept_encoding, record_request_metrics
+from lunar_cache import LunarCache
+from metrics import get_metrics
+
+
+# Timing of the last get_lunar_data awaited in this task, see AsyncLunarClient.last_timing
+last_request_timing = ContextVar("last_request_timing", default={})
+
+
+class AsyncLunarClient:
+    """
+    Asynchronous LunarCrush client that keeps several time-series/v2 requests
+    in flight at once. Concurrency is capped by a semaphore and the request rate
+    by a RateLimiter seeded from public.api_request_logs, or by a KeyPool that
+    sends every request with the key that has the most headroom. Cached responses
+    (LunarCache) are served without spending quota. The last request's timing is in
+    last_timing (per task) and the running totals in stats.
+
+    Usage:
+    async with AsyncLunarClient() as client:
+        result_code, data_df = await client.get_lunar_data(symbol_id, start_time, end_time)
+    """
+
+    def __init__(self, key_name: str = "key_outlook", max_concurrency: int = 5,
+                 limiter: RateLimiter | KeyPool | None = None, max_wait: float = 60, timeout: float = 60,
+                 cache: LunarCache | None = None):
+        self.key_name = key_name
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter if limiter is not None else RateLimiter(key_name)
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.cache = cache if cache is not None else LunarCache()
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        self.stats = {"requests": 0, "cache_hits": 0, "bytes": 0, "network_time": 0.0, "decode_time": 0.0}
+
+    @property
+    def last_timing(self) -> dict:
+        return last_request_timing.get()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """
+        Opens the HTTP session and seeds the rate limiter from public.api_request_logs.
+        In replay mode nothing is opened, every request is served from the cache.
+        """
+        if self.cache.replay:
+            return
+
+        await asyncio.to_thread(self.limiter.seed)
+
+        # Authorization is set per request, the key depends on the limiter
+        self._session = aiohttp.ClientSession(
+            headers={
+                'Accept-Encoding': accept_encoding,
+                'Accept': 'application/json'
+            },
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _acquire_quota(self) -> str | None:
+        """
+        Waits until the limiter has a free slot and returns the key to send the request with.
+        Returns None when the next slot is further away than max_wait (e.g. the daily limit is spent).
+        """
+        start = time.perf_counter()
+        while True:
+            key_name, wait = self.limiter.try_acquire_key()
+            if key_name is not None:
+                get_metrics().observe("landing_stage_seconds", time.perf_counter() - start, stage="limiter_wait")
+                return key_name
+            if wait > self.max_wait:
+                return None
+            await asyncio.sleep(wait)
+
+    async def get_lunar_data(self, symbol_id: int, start_time: str, end_time: str) -> tuple[int, pd.DataFrame]:
+        """
+        Asynchronous counterpart of get_lunar_data. Returns the same result codes and DataFrame layout.
+
+        Args:
+        symbol_id (int): The ID of the symbol.
+        start_time (str): Start date in the format "dd.mm.yyyy hh:mm".
+        end_time (str): End date in the format "dd.mm.yyyy hh:mm".
+
+        Returns:
+        Tuple[int, pd.DataFrame]: A tuple containing the result code and raw data as a pandas DataFrame.
+        """
+        url = build_lunar_data_url(symbol_id, start_time, end_time)
+
+        start_time_network = time.perf_counter()
+        body = await asyncio.to_thread(self.cache.get, url)
+        cached = body is not None
+        key_name = self.key_name
+
+        if not cached:
+            if self.cache.replay:
+                print(f"Cache miss in replay mode: {url}")
+                return 9009, pd.DataFrame()
+
+            async with self._semaphore:
+                key_name = await self._acquire_quota()
+                if key_name is None:
+                    return 9002, pd.DataFrame()
+
+                try:
+                    register_api_request("LunarCrush", key_name, "get_lunar_data", url)
+                    start_time_network = time.perf_counter()
+                    headers = {'Authorization': f"Bearer {lunar_key[key_name]['code']}"}
+                    async with self._session.get(url, headers=headers) as response:
+                        if response.status >= 400:
+                            print(f"HTTP Error: {response.status} - {response.reason}")
+                            get_metrics().inc("landing_results_total", stage="fetch", code=response.status)
+                            return response.status, pd.DataFrame()
+                        body = await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"Request failed: {e}")
+                    get_metrics().inc("landing_results_total", stage="fetch", code=9000)
+                    return 9000, pd.DataFrame()
+        network_time = time.perf_counter() - start_time_network
+
+        start_time_decode = time.perf_counter()
+        try:
+            data = json_loads(body)
+        except ValueError as e:
+            print(f"Error processing JSON data: {e}")
+            get_metrics().inc("landing_results_total", stage="decode", code=9001)
+            return 9001, pd.DataFrame()
+        decode_time = time.perf_counter() - start_time_decode
+
+        if not cached:
+            await asyncio.to_thread(self.cache.put, url, body)
+
+        self.stats["cache_hits" if cached else "requests"] += 1
+        self.stats["bytes"] += len(body)
+        self.stats["network_time"] += network_time
+        self.stats["decode_time"] += decode_time
+        record_request_metrics(key_name, network_time, decode_time, len(body), cached)
+
+        # Parsing is CPU bound, keep it off the event loop
+        start_time_parse = time.perf_counter()
+        result = await asyncio.to_thread(parse_lunar_data, symbol_id, data)
+        parse_time = time.perf_counter() - start_time_parse
+        get_metrics().observe("landing_stage_seconds", parse_time, stage="parse")
+
+        last_request_timing.set({"network_time": network_time, "decode_time": decode_time, "parse_time": parse_time,
+                                 "bytes": len(body), "cached": cached})
+        return result
+
@@ -1,16 +1,16 @@
 import pandas as pd
-import requests
-import json
 from datetime import datetime
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
 
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import lunar_key, connection_string
-from utils import register_api_request
+from utils import lunar_data_columns, lunar_write_dtypes, apply_lunar_dtypes, merge_lunar_data
+from summary_refresh import refresh_summaries
+from db import get_engine, copy_dataframe
 from lunar_symbols import read_lunar_symbols
+from lunar_http import get_lunar_client, lunar_base_url
+from metrics import get_metrics
 
 def get_lunar_data(symbol_id: int = 3, start_time: str = "01.01.2020 00:00", end_time: str = "19.08.2025 23:00") -> tuple[int, pd.DataFrame]:
     """
@@ -24,42 +24,57 @@ def get_lunar_data(symbol_id: int = 3, start_time: str = "01.01.2020 00:00", end
     Returns:
     Tuple[int, pd.DataFrame]: A tuple containing the result code and raw data as a pandas DataFrame.
     """
-    # Combine date with default start and end times
-    start_datetime = f"{start_time}"
-    end_datetime = f"{end_time}"
+    # Construct the API URL with the symbol_id and Unix timestamps
+    url = build_lunar_data_url(symbol_id, start_time, end_time)
+
+    result_code, data = get_lunar_client().get_json(url, function_name="get_lunar_data")
+    if result_code != 1:
+        return result_code, pd.DataFrame()
+
+    with get_metrics().timer("landing_stage_seconds", stage="parse"):
+        return parse_lunar_data(symbol_id, data)
+
+
+def build_lunar_data_url(symbol_id: int, start_time: str, end_time: str) -> str:
+    """
+    Build the LunarCrush time-series/v2 URL for a symbol and time window.
+
+    Args:
+    symbol_id (int): The ID of the symbol.
+    start_time (str): Start date in the format "dd.mm.yyyy hh:mm".
+    end_time (str): End date in the format "dd.mm.yyyy hh:mm".
 
+    Returns:
+    str: The hourly time-series URL.
+    """
     # Convert to Unix timestamps
-    start_unix = int(datetime.strptime(start_datetime, "%d.%m.%Y %H:%M").timestamp())
-    end_unix = int(datetime.strptime(end_datetime, "%d.%m.%Y %H:%M").timestamp())
+    start_unix = int(datetime.strptime(start_time, "%d.%m.%Y %H:%M").timestamp())
+    end_unix = int(datetime.strptime(end_time, "%d.%m.%Y %H:%M").timestamp())
 
-    key_code = lunar_key["key_outlook"]["code"]
+    return f"{lunar_base_url}/coins/{symbol_id}/time-series/v2?bucket=hour&interval=all&start={start_unix}&end={end_unix}"
 
-    # Construct the API URL with the symbol_id and Unix timestamps
-    url = f"https://lunarcrush.com/api4/public/coins/{symbol_id}/time-series/v2?bucket=hour&interval=all&start={start_unix}&end={end_unix}"
-    headers = {
-        'Authorization': f"Bearer {key_code}"
-    }
 
-    try:
-        register_api_request("LunarCrush", "key_outlook", "get_lunar_data", url)
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
+# Define the final column order, the same as landing.lunar_data
+final_columns = lunar_data_columns
 
-    except requests.exceptions.HTTPError as e:
-        print(f"HTTP Error: {e.response.status_code} - {e.response.reason}")
-        return e.response.status_code, pd.DataFrame()
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
-        return 9000, pd.DataFrame()
 
+def parse_lunar_data(symbol_id: int, data: dict) -> tuple[int, pd.DataFrame]:
+    """
+    Turn a decoded time-series/v2 payload into the landing DataFrame layout.
+
+    Args:
+    symbol_id (int): The ID of the symbol the payload belongs to.
+    data (dict): Decoded JSON response from LunarCrush.
+
+    Returns:
+    Tuple[int, pd.DataFrame]: A tuple containing the result code and the data as a pandas DataFrame.
+    """
     try:
-        data = response.json()
         if not data.get('data'):
             #print(f"No data returned from LunarCrush for symbol_id {symbol_id}.")
             return 2, pd.DataFrame()
         data_df = pd.DataFrame(data['data'])
-    except (json.JSONDecodeError, KeyError) as e:
+    except (AttributeError, KeyError) as e:
         print(f"Error processing JSON data: {e}")
         return 9001, pd.DataFrame()
 
@@ -72,38 +87,17 @@ def get_lunar_data(symbol_id: int = 3, start_time: str = "01.01.2020 00:00", end
     # Convert 'time_unix' to 'datetime' and add as a new column
     data_df['datetime'] = pd.to_datetime(data_df['time_unix'], unit='s')
 
-    # Define the final column order
-    final_columns = [
-        'symbol_id',
-        'datetime',
-        'time_unix',
-        'open',
-        'high',
-        'low',
-        'close',
-        'volume_24h',
-        'market_cap',
-        'circulating_supply',
-        'sentiment',
-        'contributors_active',
-        'contributors_created',
-        'posts_active',
-        'posts_created',
-        'interactions',
-        'social_dominance',
-        'galaxy_score',
-        'volatility',
-        'alt_rank',
-        'spam'
-    ]
-
     # Add missing columns with None (NaN) values
     for col in final_columns:
         if col not in data_df.columns:
             data_df[col] = None
 
-    # Reorder columns according to the final column order
-    data_df = data_df[final_columns]
+    # Reorder columns according to the final column order, typed like the landing.lunar_data columns
+    try:
+        data_df = apply_lunar_dtypes(data_df[final_columns], lunar_write_dtypes)
+    except (ValueError, TypeError, OverflowError) as e:
+        print(f"Error typing LunarCrush data for symbol_id {symbol_id}: {e}")
+        return 9001, pd.DataFrame()
 
     return 1, data_df
 
@@ -112,42 +106,52 @@ def get_lunar_data(symbol_id: int = 3, start_time: str = "01.01.2020 00:00", end
 #print(result)
 #print(data_df.head())
 
-def save_lunar_data(data_df: pd.DataFrame, table_name: str = 'buffer_lunar_data') -> tuple[int, str]:
+def save_lunar_data(data_df: pd.DataFrame, table_name: str = 'buffer_lunar_data', merge: bool = False) -> tuple[int, str]:
     """
     Save the processed LunarCrush data DataFrame into the specified SQL table.
 
     Args:
     data_df (pd.DataFrame): The DataFrame containing LunarCrush data to be saved.
     table_name (str): The name of the SQL table to insert the data into. Default is 'landing.buffer_lunar_data'.
+    merge (bool): Skip the buffer and upsert straight into landing.lunar_data through a temporary staging table.
 
     Returns:
     Tuple[int, str]: A tuple containing the result code and the SQL server's message as a string.
     """
     try:
-        # Create SQLAlchemy engine using the connection string
-        engine = create_engine(connection_string)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-        
-        # Save the DataFrame to the SQL table
-        with engine.connect() as connection:
-            data_df.to_sql(table_name, connection, schema='landing', if_exists='append', index=False)
-        
-        #update symbols table
-        symbol_id = int(data_df['symbol_id'].max())
-        max_time_unix = int(data_df['time_unix'].max())
-        last_update_time = datetime.now()
-        query = text("""
-            UPDATE public.symbols
-            SET last_update = :last_update_time, last_timestamp = :max_timestamp
-            WHERE id = :symbol_id;
-            """)
-        
-        session.execute(query, {'last_update_time': last_update_time, 'max_timestamp': max_time_unix, 'symbol_id': symbol_id})
-        session.commit()
+        # Use the shared ingestion engine
+        engine = get_engine("ingestion")
+
+        with engine.begin() as connection:
+            if merge:
+                # Stage the DataFrame next to the session and merge it on (symbol_id, time_unix)
+                connection.execute(text("CREATE TEMP TABLE stage_lunar_data (LIKE landing.buffer_lunar_data) ON COMMIT DROP"))
+                copy_dataframe(connection, data_df, 'stage_lunar_data', schema='pg_temp')
+                report = merge_lunar_data(connection, 'pg_temp.stage_lunar_data')
+                message = f"Data merged into landing.lunar_data: inserted {report['inserted']}, updated {report['updated']}, skipped {report['skipped']}."
+            else:
+                # Stream the DataFrame into the SQL table with COPY
+                copy_dataframe(connection, data_df, table_name, schema='landing')
+                message = "Data successfully inserted into the table."
+
+            #update symbols table
+            symbol_id = int(data_df['symbol_id'].max())
+            max_time_unix = int(data_df['time_unix'].max())
+            last_update_time = datetime.now()
+            query = text("""
+                UPDATE public.symbols
+                SET last_update = :last_update_time, last_timestamp = GREATEST(COALESCE(last_timestamp, 0), :max_timestamp)
+                WHERE id = :symbol_id;
+                """)
+
+            connection.execute(query, {'last_update_time': last_update_time, 'max_timestamp': max_time_unix, 'symbol_id': symbol_id})
+
+            if merge:
+                # The buffer path refreshes them in dump_lunar_buffer
+                refresh_summaries(connection, 'pg_temp.stage_lunar_data')
 
         # If the operation succeeds, return a success code and message
-        return 1, "Data successfully inserted into the table."
+        return 1, message
     
         
 
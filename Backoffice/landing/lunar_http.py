@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    # Optional: several times faster than json for the large time-series payloads
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    # Optional: lets urllib3 decode brotli compressed responses
+    import brotli  # noqa: F401
+    accept_encoding = "br, gzip, deflate"
+except ImportError:
+    accept_encoding = "gzip, deflate"
+
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import lunar_key
+from utils import register_api_request
+from lunar_cache import LunarCache
+from metrics import get_metrics
+from rate_limiter import current_key, request_logged
+
+
+# API root, override to point the pipeline at a mock server (see benchmarks/mock_lunar_server.py)
+lunar_base_url = os.environ.get("LUNAR_BASE_URL", "https://lunarcrush.com/api4/public").rstrip('/')
+
+class LunarClient:
+    """
+    Shared LunarCrush HTTP client: one keep-alive session with a connection pool,
+    compressed responses, timeouts and a single JSON decode step. Responses go
+    through the on-disk LunarCache; in replay mode the network is never used.
+
+    Network time (request until the body is read) and decode time are measured
+    separately; the last request's timing is in last_timing (per thread) and the
+    running totals in stats.
+    """
+
+    def __init__(self, timeout: tuple[float, float] = (5, 60), pool_size: int = 10, cache: LunarCache | None = None):
+        self.timeout = timeout
+        self.cache = cache if cache is not None else LunarCache()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({'Accept-Encoding': accept_encoding, 'Accept': 'application/json'})
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "cache_hits": 0, "bytes": 0, "network_time": 0.0, "decode_time": 0.0}
+
+    @property
+    def last_timing(self) -> dict:
+        return getattr(self._local, "timing", {})
+
+    def _record(self, network_time: float, decode_time: float, size: int, cached: bool) -> None:
+        self._local.timing = {"network_time": network_time, "decode_time": decode_time, "bytes": size, "cached": cached}
+        with self._stats_lock:
+            self.stats["cache_hits" if cached else "requests"] += 1
+            self.stats["bytes"] += size
+            self.stats["network_time"] += network_time
+            self.stats["decode_time"] += decode_time
+
+    def is_cached(self, url: str) -> bool:
+        """
+        True when get_json would answer url from the cache without spending quota.
+        """
+        return self.cache.contains(url)
+
+    def get_json(self, url: str, key_name: str | None = None, function_name: str = "get_json") -> tuple[int, dict]:
+        """
+        GETs a LunarCrush URL and decodes the JSON body. Network requests are registered
+        in api_request_logs, cache hits are not.
+
+        Args:
+        url (str): Full API URL.
+        key_name (str): Name of the key in config.lunar_key used for authorization. Defaults to the
+                        key the last KeyPool.acquire picked (rate_limiter.current_key).
+        function_name (str): Caller name logged with the request.
+
+        Returns:
+        Tuple[int, dict]: result code (1 on success, the HTTP status, 9000 request failure,
+        9001 invalid JSON, 9009 cache miss in replay mode) and the decoded payload (empty dict on failure).
+        """
+        key_name = key_name or current_key.get()
+        # SharedKeyPool logged the request when it granted the slot; cleared on every path,
+        # also when the url turned out to be cached, so the next request is not left unlogged
+        logged = request_logged.get()
+        request_logged.set(False)
+
+        start_time = time.perf_counter()
+        body = self.cache.get(url)
+        cached = body is not None
+
+        if not cached:
+            if self.cache.replay:
+                print(f"Cache miss in replay mode: {url}")
+                return 9009, {}
+
+            headers = {'Authorization': f"Bearer {lunar_key[key_name]['code']}"}
+            if not logged:
+                register_api_request("LunarCrush", key_name, function_name, url)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+                body = response.content
+            except requests.exceptions.HTTPError as e:
+                print(f"HTTP Error: {e.response.status_code} - {e.response.reason}")
+                get_metrics().inc("landing_results_total", stage="fetch", code=e.response.status_code)
+                return e.response.status_code, {}
+            except requests.exceptions.RequestException as e:
+                print(f"Request failed: {e}")
+                get_metrics().inc("landing_results_total", stage="fetch", code=9000)
+                return 9000, {}
+        network_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        try:
+            data = json_loads(body)
+        except ValueError as e:
+            print(f"Error processing JSON data: {e}")
+            get_metrics().inc("landing_results_total", stage="decode", code=9001)
+            return 9001, {}
+        decode_time = time.perf_counter() - start_time
+
+        if not cached:
+            self.cache.put(url, body)
+
+        self._record(network_time, decode_time, len(body), cached)
+        record_request_metrics(key_name, network_time, decode_time, len(body), cached)
+        return 1, data
+
+
+def record_request_metrics(key_name: str, network_time: float, decode_time: float, size: int, cached: bool) -> None:
+    """
+    Publishes one successful response: fetch and decode latency, request and byte counters.
+    """
+    metrics = get_metrics()
+    metrics.inc("landing_requests_total", key_name=key_name, cached=cached)
+    metrics.inc("landing_response_bytes_total", size, cached=cached)
+    metrics.inc("landing_results_total", stage="fetch", code=1)
+    if not cached:
+        metrics.observe("landing_stage_seconds", network_time, stage="fetch")
+    metrics.observe("landing_stage_seconds", decode_time, stage="decode")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_lunar_client() -> LunarClient:
+    """
+    Returns the process-wide LunarClient.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LunarClient()
+        return _client
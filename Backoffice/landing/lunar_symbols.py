@@ -1,14 +1,11 @@
-import requests
-import json
 import pandas as pd
-from sqlalchemy import create_engine
-
+from sqlalchemy import text
 
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import lunar_key, connection_string
-from utils import register_api_request
+from db import get_engine, copy_dataframe
+from lunar_http import get_lunar_client, lunar_base_url
 
 def get_lunar_symbols() -> tuple[int, pd.DataFrame] :
     """
@@ -20,25 +17,12 @@ def get_lunar_symbols() -> tuple[int, pd.DataFrame] :
     Returns:
     Tuple[int,pd.DataFrame]: A tuple containing the result code and raw data as a pandas DataFrame.
     """
-    key_code = lunar_key["key_outlook"]["code"]
+    url = f"{lunar_base_url}/coins/list/v1"
 
-    url = "https://lunarcrush.com/api4/public/coins/list/v1"
-    headers = {
-        'Authorization': f'Bearer {key_code}'
-    }
+    result_code, data = get_lunar_client().get_json(url, function_name="get_lunar_symbols")
+    if result_code != 1:
+        return result_code, pd.DataFrame()
 
-    try:
-        response = requests.request("GET", url=url, headers=headers)
-        response.raise_for_status()
-        register_api_request("LunarCrush", "key_outlook", "get_lunar_symbols", url)
-    except requests.exceptions.HTTPError as e:
-        print(f"HTTP Error: {e.response.status_code} - {e.response.reason}")
-        return e.response.status_code, pd.DataFrame()
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}")
-        return 9000, pd.DataFrame()
-    
-    data = json.loads(response.text.encode('utf-8'))
     symbols_list = pd.DataFrame.from_dict(data['data'])
     
     return 1, symbols_list
@@ -55,7 +39,7 @@ def read_lunar_symbols() -> tuple[int, pd.DataFrame]:
     Returns:
     Tuple[int,pd.DataFrame]: result code and full public.symbols table
     """
-    engine = create_engine(connection_string)
+    engine = get_engine("ingestion")
 
     try:
         with engine.connect() as connection:
@@ -75,46 +59,99 @@ def read_lunar_symbols() -> tuple[int, pd.DataFrame]:
 #print(data)
 
 
-def save_lunar_symbols(symbols_df) -> tuple[int,str]:
-    """
-    Save the symbols data frame into the 'symbols' table.
-    
-    Args:
-    symbols_list (pd.DataFrame): DataFrame containing symbols data to be saved.
-    
-    Returns:
-    Tuple[int, str]: result code and message indicating the outcome.
-    """
+# Catalog columns taken from coins/list/v1, the rest of public.symbols is ours
+catalog_columns = ['id', 'name', 'symbol', 'topic']
 
-    symbols_df_short = symbols_df[['id','name','symbol','topic']]
+# A payload listing fewer than this share of the listed symbols is treated as truncated, nothing is delisted
+min_catalog_share = 0.5
 
-    # read sql
-    result_sql, symbols_sql = read_lunar_symbols()
-    if result_sql != 1:
-        return result_sql, "Failed to read existing symbols from the database."
 
+def save_lunar_symbols(symbols_df) -> tuple[int, dict]:
+    """
+    Syncs public.symbols with the full coins/list/v1 catalog in one set-based statement:
+    new coins are inserted, changed names, tickers and topics updated, and symbols missing
+    from the catalog get status 'Delisted' (back to 'Listed' when they return).
+    include_etl, last_update and last_timestamp of existing symbols are never touched.
 
-    # Find new symbols that are not in the existing database
-    symbols_to_insert = symbols_df_short[~symbols_df_short['id'].isin(symbols_sql['id'])]
-    symbols_to_insert['status'] = "New symbol" 
-    symbols_to_insert['last_update'] = pd.Timestamp.now()
-    symbols_to_insert['last_timestamp'] = pd.Timestamp.now().timestamp()
-    
-    if symbols_to_insert.empty:
-        return 1, 'No new symbols to insert.'
+    Args:
+    symbols_df (pd.DataFrame): The catalog as returned by get_lunar_symbols.
+
+    Returns:
+    Tuple[int, dict]: result code (2 for an empty catalog, 9003 on error) and the counts
+    of received, inserted, updated and delisted symbols.
+    """
+    catalog_df = symbols_df.reindex(columns=catalog_columns).dropna(subset=['id'])
+    if catalog_df.empty:
+        return 2, {"received": 0, "inserted": 0, "updated": 0, "delisted": 0}
+    catalog_df = catalog_df.astype({'id': 'int64'})
+
+    compared = ' OR '.join(f"symbols.{col} IS DISTINCT FROM EXCLUDED.{col}" for col in catalog_columns[1:])
+    query = text(f"""
+        WITH source AS (
+            SELECT DISTINCT ON (id) id, name, symbol, topic
+            FROM pg_temp.stage_symbols
+            ORDER BY id
+        ),
+        existing AS (
+            -- Sees public.symbols as it was before the insert below
+            SELECT s.id
+            FROM source s
+            JOIN public.symbols USING (id)
+        ),
+        upserted AS (
+            INSERT INTO public.symbols AS symbols (id, name, symbol, topic, status, last_update, last_timestamp)
+            SELECT id, name, symbol, topic, 'New symbol', :now, :now_unix
+            FROM source
+            ON CONFLICT (id) DO UPDATE SET
+                name = EXCLUDED.name,
+                symbol = EXCLUDED.symbol,
+                topic = EXCLUDED.topic,
+                status = CASE WHEN symbols.status = 'Delisted' THEN 'Listed' ELSE symbols.status END
+            WHERE {compared} OR symbols.status = 'Delisted'
+            RETURNING id
+        ),
+        delisted AS (
+            UPDATE public.symbols
+            SET status = 'Delisted'
+            WHERE :delist
+              AND status IS DISTINCT FROM 'Delisted'
+              AND NOT EXISTS (SELECT 1 FROM source WHERE source.id = symbols.id)
+            RETURNING id
+        )
+        SELECT
+            count(*) FILTER (WHERE e.id IS NULL) AS inserted,
+            count(*) FILTER (WHERE e.id IS NOT NULL) AS updated,
+            (SELECT count(*) FROM delisted) AS delisted
+        FROM upserted u
+        LEFT JOIN existing e USING (id)
+    """)
 
     try:
-        # Insert the new symbols into the SQL database
-        engine = create_engine(connection_string)
-        with engine.connect() as connection:
-            symbols_to_insert.to_sql('symbols', connection, if_exists='append', index=False)
-        return 1, f"Inserted {len(symbols_to_insert)} new symbols into the database."
+        engine = get_engine("ingestion")
+        with engine.begin() as connection:
+            connection.execute(text("""
+                CREATE TEMP TABLE stage_symbols (id bigint, name text, symbol text, topic text) ON COMMIT DROP
+            """))
+            copy_dataframe(connection, catalog_df, 'stage_symbols', schema='pg_temp')
+
+            listed = connection.execute(text(
+                "SELECT count(*) FROM public.symbols WHERE status IS DISTINCT FROM 'Delisted'")).scalar()
+            delist = len(catalog_df) >= listed * min_catalog_share
+            if not delist:
+                print(f"Catalog lists {len(catalog_df)} of {listed} symbols, skipping delistings.")
+
+            now = pd.Timestamp.now()
+            inserted, updated, delisted = connection.execute(query, {
+                'now': now.to_pydatetime(), 'now_unix': now.timestamp(), 'delist': delist
+            }).one()
+        return 1, {"received": len(catalog_df), "inserted": inserted, "updated": updated, "delisted": delisted}
     except Exception as e:
-        return 9003, f"Failed to insert new symbols: {e}"
+        print(f"Failed to sync symbols: {e}")
+        return 9003, {}
 
 #result1, symbols_df = get_lunar_symbols()
-#result2, msg = save_lunar_symbols(symbols_df)
+#result2, report = save_lunar_symbols(symbols_df)
 #print(result1)
 #print(symbols_df)
 #print(result2)
-#print(msg)
\ No newline at end of file
+#print(report)
\ No newline at end of file
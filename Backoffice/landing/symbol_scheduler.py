@@ -0,0 +1,150 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db import get_engine
+
+
+# Score weights, see rank_symbols
+scheduler_weights = {
+    "posts_created": 1.0,
+    "interactions": 1.0,
+    "social_dominance": 1.0,
+    "interactions_spike": 2.0,
+}
+
+# Share of the score a symbol keeps with no social activity at all, so dead symbols still refresh eventually
+activity_floor = 0.1
+
+# Watch weight for symbols not listed in watch_weights
+default_watch_weight = 1.0
+
+scheduler_log_path = os.path.join(os.path.dirname(__file__), 'scheduler_log.csv')
+
+
+def read_symbol_activity() -> tuple[int, pd.DataFrame]:
+    """
+    Reads the latest social activity per symbol from landing.market_data_summary_1_24.
+
+    Returns:
+    Tuple[int, pd.DataFrame]: result code and symbol_id, posts_created, interactions,
+    social_dominance and interactions_24h (interactions 24 hours earlier).
+    """
+    query = text("""
+        SELECT
+            symbol_id,
+            (array_agg(posts_created ORDER BY time_unix DESC))[1] AS posts_created,
+            (array_agg(interactions ORDER BY time_unix DESC))[1] AS interactions,
+            (array_agg(social_dominance ORDER BY time_unix DESC))[1] AS social_dominance,
+            (array_agg(interactions ORDER BY time_unix ASC))[1] AS interactions_24h
+        FROM landing.market_data_summary_1_24
+        GROUP BY symbol_id
+    """)
+    try:
+        engine = get_engine("ingestion")
+        with engine.connect() as connection:
+            activity_df = pd.read_sql_query(query, connection)
+        return 1, activity_df
+    except Exception as e:
+        print(f"Error reading symbol activity: {e}")
+        return 9008, pd.DataFrame()
+
+
+def rank_symbols(symbols_df: pd.DataFrame, activity_df: pd.DataFrame, watch_weights: dict | None = None,
+                 now: float | None = None) -> pd.DataFrame:
+    """
+    Ranks symbols by how much a refresh is worth right now:
+
+    score = watch_weight * log1p(hours_stale) * (activity_floor + (1 - activity_floor) * activity)
+
+    hours_stale is the number of whole hours since last_timestamp (0 means nothing new to fetch),
+    and at most the number of hours begun since last_attempt, so a symbol whose last fetch
+    returned nothing new waits for the next hour instead of being fetched again every round.
+    activity is the weighted mean of the cross-sectional percentile ranks of posts_created,
+    interactions, social_dominance and the 24h interactions spike, so it lies in [0, 1].
+
+    Args:
+    symbols_df (pd.DataFrame): public.symbols as returned by read_lunar_symbols.
+    activity_df (pd.DataFrame): Output of read_symbol_activity.
+    watch_weights (dict): symbol_id -> weight; missing symbols get default_watch_weight.
+    now (float): Unix time to measure staleness from. Defaults to the current time.
+
+    Returns:
+    pd.DataFrame: symbols_df columns plus the score components, sorted by score descending.
+    """
+    if now is None:
+        now = datetime.now().timestamp()
+
+    ranked = symbols_df.merge(activity_df, on='symbol_id', how='left')
+
+    ranked['hours_stale'] = np.floor((now - ranked['last_timestamp'].astype('float64')) / 3600).clip(lower=0)
+    if 'last_attempt' in ranked.columns:
+        # Requires staging/symbols_last_attempt.sql; symbols never attempted keep their staleness
+        hours_since_attempt = now // 3600 - ranked['last_attempt'].astype('float64') // 3600
+        ranked['hours_stale'] = ranked['hours_stale'].clip(upper=hours_since_attempt.clip(lower=0))
+
+    spike = ranked['interactions'] / ranked['interactions_24h'].where(ranked['interactions_24h'] > 0)
+    ranked['interactions_spike'] = spike
+
+    total_weight = sum(scheduler_weights.values())
+    activity = sum(
+        weight * ranked[col].rank(pct=True).fillna(0)
+        for col, weight in scheduler_weights.items()
+    ) / total_weight
+    ranked['activity'] = activity
+
+    weights = watch_weights or {}
+    ranked['watch_weight'] = ranked['symbol_id'].map(weights).fillna(default_watch_weight)
+
+    ranked['score'] = (
+        ranked['watch_weight']
+        * np.log1p(ranked['hours_stale'])
+        * (activity_floor + (1 - activity_floor) * ranked['activity'])
+    )
+
+    return ranked.sort_values(by=['score', 'hours_stale'], ascending=[False, False]).reset_index(drop=True)
+
+
+def select_symbols(ranked_df: pd.DataFrame, budget: int | None = None) -> pd.DataFrame:
+    """
+    Picks the symbols to refresh: positive score only, best first, at most budget of them.
+    """
+    selected = ranked_df[ranked_df['score'] > 0]
+    if budget is not None:
+        selected = selected.head(max(budget, 0))
+    return selected
+
+
+def record_attempts(symbol_ids: list[int], now: float | None = None) -> None:
+    """
+    Stores the time of the latest fetch in public.symbols.last_attempt, whether it returned rows or not.
+    """
+    if not symbol_ids:
+        return
+    try:
+        engine = get_engine("ingestion")
+        with engine.begin() as connection:
+            connection.execute(text("UPDATE public.symbols SET last_attempt = :now WHERE id = ANY(:symbol_ids)"), {
+                'now': datetime.now().timestamp() if now is None else now,
+                'symbol_ids': [int(symbol_id) for symbol_id in symbol_ids]
+            })
+    except Exception as e:
+        print(f"Error recording fetch attempts: {e}")
+
+
+def log_schedule(ranked_df: pd.DataFrame, selected_df: pd.DataFrame, path: str = scheduler_log_path) -> None:
+    """
+    Appends the scheduler decision (every candidate with its score components) to a CSV file for tuning.
+    """
+    columns = ['symbol_id', 'symbol_ticker', 'hours_stale', 'posts_created', 'interactions',
+               'social_dominance', 'interactions_spike', 'activity', 'watch_weight', 'score']
+    log_df = ranked_df[columns].copy()
+    log_df.insert(0, 'scheduled_at', datetime.now())
+    log_df['rank'] = np.arange(1, len(log_df) + 1)
+    log_df['selected'] = log_df['symbol_id'].isin(selected_df['symbol_id'])
+    log_df.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
@@ -1,81 +1,192 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from config import connection_string
-from sqlalchemy import create_engine
+from db import get_engine
+from parquet_mirror import read_mirror
+from utils import apply_lunar_dtypes
 
+import numpy as np
 import pandas as pd
+from sqlalchemy import text
 
 
 
+# Where read_symbol_data reads from: "postgres" or "parquet" (see parquet_mirror.py)
+symbol_data_backend = os.environ.get("SYMBOL_DATA_BACKEND", "postgres")
+
+
 hello = "Maciej, cieszę się, że znów robimy coś razem 😊"
 
 
+# Metric columns of market_data_summary_1_24 that get % change (_r_) and delta (_d_) columns
+market_data_columns = [
+    'open', 'high', 'low', 'close', 'volume_24h', 'market_cap',
+    'circulating_supply', 'sentiment', 'contributors_active',
+    'contributors_created', 'posts_active', 'posts_created',
+    'interactions', 'social_dominance', 'galaxy_score',
+    'volatility', 'alt_rank', 'spam'
+]
+
+# Suffix -> seconds before the latest record the change is measured against
+change_periods = {'1h': 3600, '24h': 86400}
+
+
+def calculate_market_changes(data: pd.DataFrame, columns: list[str] = market_data_columns,
+                             periods: dict[str, int] = change_periods) -> pd.DataFrame:
+    """
+    Returns the latest record per symbol_id with the % change and delta of every column
+    against the record exactly period seconds earlier (NaN when that hour is missing).
+
+    One sort, then positional NumPy indexing: the latest row of each symbol and the rows
+    at time_unix - period are looked up once and all columns are computed as 2D arrays.
+
+    Args:
+    data (pd.DataFrame): Rows with symbol_id, time_unix and the metric columns.
+    columns (list[str]): Metric columns to calculate.
+    periods (dict[str, int]): Suffix -> offset in seconds.
+
+    Returns:
+    pd.DataFrame: Latest row per symbol plus {col}_r_{suffix} and {col}_d_{suffix} columns.
+    """
+    if data.empty:
+        return data
+
+    data = data.sort_values(by=['symbol_id', 'time_unix'], kind='stable')
+    data = data.drop_duplicates(subset=['symbol_id', 'time_unix'], keep='last').reset_index(drop=True)
+
+    symbol_ids = data['symbol_id'].to_numpy()
+    time_unix = data['time_unix'].to_numpy()
+
+    # Last position of each symbol_id block
+    latest_pos = np.flatnonzero(np.append(symbol_ids[1:] != symbol_ids[:-1], True))
+    latest_data = data.iloc[latest_pos].reset_index(drop=True)
+
+    values = data[columns].to_numpy(dtype='float64')
+    latest_values = values[latest_pos]
+    index = pd.MultiIndex.from_arrays([symbol_ids, time_unix])
+
+    changes = {}
+    for suffix, seconds in periods.items():
+        target = pd.MultiIndex.from_arrays([symbol_ids[latest_pos], time_unix[latest_pos] - seconds])
+        prior_pos = index.get_indexer(target)
+        prior_values = np.where((prior_pos >= 0)[:, None], values[prior_pos], np.nan)
+
+        delta = latest_values - prior_values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = delta / prior_values * 100
+        changes[suffix] = (ratio, delta)
+
+    result_columns = {}
+    for i, col in enumerate(columns):
+        for suffix, (ratio, delta) in changes.items():
+            result_columns[f'{col}_r_{suffix}'] = ratio[:, i]
+            result_columns[f'{col}_d_{suffix}'] = delta[:, i]
+
+    return pd.concat([latest_data, pd.DataFrame(result_columns)], axis=1)
+
+
 def read_market_data_summary_1_24() -> pd.DataFrame:
     """
     Reads market_data_summary_1_24 and returns a DataFrame with the latest record for each symbol_id,
     and includes calculated percentage change and absolute delta for the last 1 hour and 24 hours.
+    include_etl and last_update come from public.symbols, for the Watched view and the default sort.
 
     Returns:
     pd.DataFrame: DataFrame with the latest data and additional columns for performance metrics.
     """
     
-    engine = create_engine(connection_string)
+    engine = get_engine("dashboard")
     
     try:
         with engine.connect() as connection:
             # Read the data from the materialized view
-            query = "SELECT * FROM landing.market_data_summary_1_24 ORDER BY symbol_id, datetime ASC"
+            query = """
+                SELECT m.*, s.include_etl, s.last_update
+                FROM landing.market_data_summary_1_24 m
+                LEFT JOIN public.symbols s ON s.id = m.symbol_id
+                ORDER BY m.symbol_id, m.datetime ASC
+            """
             data = pd.read_sql_query(query, connection)
-        
-        # Ensure the data is sorted by symbol_id and datetime ascending
-        data.sort_values(by=['symbol_id', 'datetime'], ascending=[True, True], inplace=True)
-
-        # Define the columns for which we need to calculate % change and delta
-        columns_to_calculate = [
-            'open', 'high', 'low', 'close', 'volume_24h', 'market_cap', 
-            'circulating_supply', 'sentiment', 'contributors_active', 
-            'contributors_created', 'posts_active', 'posts_created', 
-            'interactions', 'social_dominance', 'galaxy_score', 
-            'volatility', 'alt_rank', 'spam'
-        ]
-        
-        # Calculate percentage change and delta for each column
-        latest_data = data.groupby('symbol_id').last().reset_index()
-        
-        for col in columns_to_calculate:
-            # Create shifted columns directly within the loop
-            shift_1h = data.groupby('symbol_id')[col].shift(1)
-            shift_24h = data.groupby('symbol_id')[col].shift(2)
-            
-            # Calculate percentage change and delta for 1 hour and 24 hours
-            latest_data[f'{col}_r_1h'] = (latest_data[col] - shift_1h) / shift_1h * 100
-            latest_data[f'{col}_d_1h'] = latest_data[col] - shift_1h
-            
-            latest_data[f'{col}_r_24h'] = (latest_data[col] - shift_24h) / shift_24h * 100
-            latest_data[f'{col}_d_24h'] = latest_data[col] - shift_24h
-        
-        # Drop any intermediate columns if needed (in this case, no intermediate columns were created)
-        
-        return latest_data
+
+        return calculate_market_changes(data)
 
     except Exception as e:
         print(f"Error reading market_data_summary_1_24 table: {e}")
         return pd.DataFrame()
 
 
-def read_symbol_data(symbol_id) -> pd.DataFrame:
+# Leaderboard metrics of landing.symbol_changes -> label
+gainer_metrics = {'close': 'Price', 'posts_created': 'Posts', 'interactions': 'Interactions'}
+
+
+def read_top_gainers(metric: str = 'close', period: str = '24h', n: int = 10, ascending: bool = False) -> pd.DataFrame:
+    """
+    Reads the top n symbols by % change of a metric from landing.symbol_changes, the
+    per-symbol summary kept current by every merge (see summary_refresh.py).
+
+    Args:
+    metric (str): One of gainer_metrics.
+    period (str): "1h" or "24h".
+    n (int): Number of symbols.
+    ascending (bool): True for the top losers.
+
+    Returns:
+    pd.DataFrame: symbol_id, symbol_ticker, symbol_name, datetime, the metric, its value
+    period ago and change_r (%), best first.
+    """
+    if metric not in gainer_metrics or period not in change_periods:
+        raise ValueError(f"Unknown leaderboard: {metric} {period}")
+
+    engine = get_engine("dashboard")
+    try:
+        with engine.connect() as connection:
+            query = text(f"""
+                SELECT
+                    sc.symbol_id,
+                    s.symbol AS symbol_ticker,
+                    s.name AS symbol_name,
+                    sc.datetime,
+                    sc.{metric},
+                    sc.{metric}_{period},
+                    sc.{metric}_r_{period} AS change_r
+                FROM landing.symbol_changes sc
+                LEFT JOIN public.symbols s ON sc.symbol_id = s.id
+                WHERE sc.{metric}_r_{period} IS NOT NULL
+                ORDER BY sc.{metric}_r_{period} {'ASC' if ascending else 'DESC'}
+                LIMIT :n
+            """)
+            return pd.read_sql_query(query, connection, params={'n': int(n)})
+
+    except Exception as e:
+        print(f"Error reading symbol_changes table: {e}")
+        return pd.DataFrame()
+
+
+def read_symbol_data(symbol_id, since_time_unix: int | None = None, backend: str | None = None) -> pd.DataFrame:
     """
     Reads full symbol_data 
 
+    Args:
+    symbol_id (int): The ID of the symbol.
+    since_time_unix (int): Only rows with time_unix greater than this, for incremental reads.
+    backend (str): "postgres" or "parquet" (the local lunar_data mirror). Defaults to symbol_data_backend.
+
     Returns:
-    pd.DataFrame: DataFrame with full symbol data 
+    pd.DataFrame: DataFrame with full symbol data, typed with utils.lunar_data_dtypes
     """
-    engine = create_engine(connection_string)
+    if (backend or symbol_data_backend) == "parquet":
+        try:
+            start_unix = None if since_time_unix is None else int(since_time_unix) + 1
+            return apply_lunar_dtypes(read_mirror([symbol_id], start_unix=start_unix))
+        except Exception as e:
+            print(f"Error read_symbol_data from mirror: {e}")
+            return pd.DataFrame()
+
+    engine = get_engine("dashboard")
     try:
         with engine.connect() as connection:
                 # Read the data from the materialized view
-                query = f"""            
+                query = text("""            
                     select 
                         ld.symbol_id,
                         s.symbol as symbol_ticker,
@@ -102,12 +213,16 @@ def read_symbol_data(symbol_id) -> pd.DataFrame:
                         ld.spam
                     from landing.lunar_data ld
                     left join public.symbols s on ld.symbol_id = s.id
-                    where ld.symbol_id = {symbol_id}
+                    where ld.symbol_id = :symbol_id
+                      and (cast(:since_time_unix as bigint) is null or ld.time_unix > :since_time_unix)
                     order by datetime asc
-                    """
-                data = pd.read_sql_query(query, connection)
+                    """)
+                data = pd.read_sql_query(query, connection, params={
+                    'symbol_id': int(symbol_id),
+                    'since_time_unix': None if since_time_unix is None else int(since_time_unix)
+                })
 
-        return data
+        return apply_lunar_dtypes(data)
     
     except Exception as e:
         print(f"Error read_symbol_data: {e}")
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+
+# Points per series sent to the browser, roughly the pixel width of the chart
+chart_points = 1500
+
+# Downsampling method per column. Extremes (highs, lows) and spiky flows, where a single
+# hour can matter, use "minmax" so no peak or trough is dropped; level-like series use "lttb".
+downsample_methods = {
+    'open': 'lttb',
+    'high': 'minmax',
+    'low': 'minmax',
+    'close': 'lttb',
+    'volume_24h': 'minmax',
+    'market_cap': 'lttb',
+    'circulating_supply': 'lttb',
+    'sentiment': 'lttb',
+    'contributors_active': 'lttb',
+    'contributors_created': 'minmax',
+    'posts_active': 'lttb',
+    'posts_created': 'minmax',
+    'interactions': 'minmax',
+    'social_dominance': 'lttb',
+    'galaxy_score': 'lttb',
+    'volatility': 'lttb',
+    'alt_rank': 'lttb',
+    'spam': 'minmax',
+}
+
+
+def bucket_edges(n: int, n_buckets: int) -> np.ndarray:
+    """
+    Splits positions 0..n-1 into n_buckets contiguous, equally sized runs. Returns n_buckets + 1 edges.
+    """
+    return np.linspace(0, n, n_buckets + 1).astype('int64')
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Min-max downsampling: keeps the positions of the lowest and highest value of every bucket,
+    so spikes survive. Returns sorted positions, at most n_out of them. NaNs are never picked
+    unless a bucket holds nothing else.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+
+    starts = bucket_edges(n, n_out // 2)[:-1]
+    low = np.where(np.isnan(y), np.inf, y)
+    high = np.where(np.isnan(y), -np.inf, y)
+
+    # Position of the min / max inside each run: compare every value with its run's extreme
+    run = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    positions = np.arange(n)
+    is_min = low == np.minimum.reduceat(low, starts)[run]
+    is_max = high == np.maximum.reduceat(high, starts)[run]
+    min_positions = np.minimum.reduceat(np.where(is_min, positions, n), starts)
+    max_positions = np.minimum.reduceat(np.where(is_max, positions, n), starts)
+
+    return np.unique(np.r_[min_positions, max_positions])
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last point and, for every bucket in
+    between, the point forming the largest triangle with the previously kept point and the
+    average of the next bucket. Returns sorted positions, n_out of them.
+    """
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype('float64')
+    y = np.where(np.isnan(y), 0.0, y.astype('float64'))
+    edges = np.r_[1, bucket_edges(n - 2, n_out - 2)[1:] + 1]
+
+    # Averages of every bucket, the last point acts as the bucket after the last one
+    counts = np.diff(edges)
+    avg_x = np.r_[np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1]]
+    avg_y = np.r_[np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1]]
+
+    selected = np.empty(n_out, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs((x[previous] - avg_x[i + 1]) * (bucket_y - y[previous])
+                      - (x[previous] - bucket_x) * (avg_y[i + 1] - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def visible_window(data: pd.DataFrame, x_range: tuple | None, x_col: str = 'datetime') -> pd.DataFrame:
+    """
+    Returns the rows of a frame sorted by x_col that fall into x_range, plus one row on each
+    side so lines continue past the edges of the chart.
+    """
+    if x_range is None or data.empty:
+        return data
+
+    x = data[x_col]
+    start = max(x.searchsorted(pd.Timestamp(x_range[0]), side='left') - 1, 0)
+    end = min(x.searchsorted(pd.Timestamp(x_range[1]), side='right') + 1, len(data))
+    return data.iloc[start:end]
+
+
+def downsample(data: pd.DataFrame, y_col: str, n_out: int = chart_points, method: str | None = None,
+               x_col: str = 'datetime') -> pd.DataFrame:
+    """
+    Reduces one series of a frame (sorted by x_col) to about n_out points.
+
+    Args:
+    data (pd.DataFrame): Rows to plot, e.g. the visible window of read_symbol_data.
+    y_col (str): Column to downsample.
+    n_out (int): Target number of points.
+    method (str): "lttb" (shape preserving) or "minmax" (keeps every spike). Defaults to
+                  downsample_methods[y_col], "lttb" for columns not listed there.
+
+    Returns:
+    pd.DataFrame: x_col and y_col of the selected rows.
+    """
+    method = method or downsample_methods.get(y_col, 'lttb')
+    series = data[[x_col, y_col]]
+    if len(series) <= n_out:
+        return series
+
+    y = series[y_col].to_numpy(dtype='float64')
+    if method == 'minmax':
+        positions = minmax_indices(y, n_out)
+    elif method == 'lttb':
+        x = series[x_col].to_numpy(dtype='datetime64[ns]').astype('int64')
+        positions = lttb_indices(x, y, n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return series.iloc[positions]
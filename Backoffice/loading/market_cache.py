@@ -0,0 +1,238 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Mapping
+
+import pandas as pd
+
+
+# Seconds between background refreshes of the market summary
+market_cache_ttl = 300
+
+# View name -> row filter; None keeps every row
+market_filters = {
+    'all': None,
+    'watched': lambda df: df['include_etl'] == True,
+    'micro': lambda df: df['close'] < 0.001,
+}
+
+# Newest first
+market_sort_column = 'last_update'
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """
+    One published version of the market summary. Treat the frames as read-only:
+    callbacks slice them, they never modify them in place.
+    """
+    data: pd.DataFrame
+    views: Mapping[str, pd.DataFrame]
+    loaded_at: datetime
+    load_time: float
+    version: int
+    sorted_views: dict = field(default_factory=dict, compare=False, repr=False)  # (view, sort) -> frame, filled lazily
+
+
+def build_market_views(data: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """
+    Sorts the summary once and applies every filter in market_filters.
+    Raises KeyError when the loader did not return a column the sort or a filter needs,
+    refresh then keeps the previous snapshot.
+    """
+    if market_sort_column not in data.columns:
+        raise KeyError(f"Market data needs column '{market_sort_column}' to sort the views")
+    data = data.sort_values(by=market_sort_column, ascending=False, kind='stable').reset_index(drop=True)
+
+    views = {}
+    for name, row_filter in market_filters.items():
+        if row_filter is None:
+            views[name] = data
+            continue
+        try:
+            views[name] = data[row_filter(data)].reset_index(drop=True)
+        except KeyError as e:
+            raise KeyError(f"Market view '{name}' needs column {e}") from e
+    return views
+
+
+class MarketDataCache:
+    """
+    Server-side cache of the market summary for the Dash app.
+
+    A daemon thread calls loader every ttl seconds, builds the sorted and filtered
+    views and publishes them as a new MarketSnapshot by swapping a single reference,
+    so readers always see one complete version without locking. A failed or empty
+    load keeps the previous snapshot.
+    """
+
+    def __init__(self, loader: Callable[[], pd.DataFrame], ttl: float = market_cache_ttl):
+        self.loader = loader
+        self.ttl = ttl
+
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def snapshot(self) -> MarketSnapshot | None:
+        return self._snapshot
+
+    def view(self, name: str = 'all') -> pd.DataFrame:
+        """
+        Returns a pre-sorted view of the current snapshot (empty before the first load).
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return pd.DataFrame()
+        return snapshot.views.get(name, snapshot.views['all'])
+
+    def sorted_view(self, name: str = 'all', sort_by: list[dict] | None = None) -> pd.DataFrame:
+        """
+        Returns a view ordered by DataTable sort_by ([{'column_id': ..., 'direction': 'asc'|'desc'}]).
+        Each ordering is computed once per snapshot.
+        """
+        snapshot = self._snapshot
+        data = self.view(name)
+        sort_by = [sort for sort in sort_by or [] if sort['column_id'] in data.columns]
+        if snapshot is None or not sort_by:
+            return data
+
+        key = (name, tuple((sort['column_id'], sort['direction']) for sort in sort_by))
+        sorted_data = snapshot.sorted_views.get(key)
+        if sorted_data is None:
+            sorted_data = data.sort_values(
+                by=[sort['column_id'] for sort in sort_by],
+                ascending=[sort['direction'] == 'asc' for sort in sort_by],
+                kind='stable',
+                na_position='last'
+            ).reset_index(drop=True)
+            snapshot.sorted_views[key] = sorted_data
+        return sorted_data
+
+    def refresh(self) -> bool:
+        """
+        Loads the summary and publishes a new snapshot. Returns True when the snapshot was replaced.
+        """
+        with self._refresh_lock:
+            start_time = time.perf_counter()
+            data = self.loader()
+            if data is None or data.empty:
+                print("Market data refresh returned no rows, keeping the previous snapshot")
+                return False
+
+            views = build_market_views(data)
+            load_time = time.perf_counter() - start_time
+            version = self._snapshot.version + 1 if self._snapshot is not None else 1
+            self._snapshot = MarketSnapshot(
+                data=views['all'],
+                views=MappingProxyType(views),
+                loaded_at=datetime.now(),
+                load_time=load_time,
+                version=version
+            )
+            return True
+
+    def start(self) -> None:
+        """
+        Loads the first snapshot synchronously, then keeps refreshing in the background.
+        """
+        if self._thread is not None:
+            return
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-data-cache", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.ttl):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Market data refresh failed: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+# DataTable filter_query operators, longest first so ">=" wins over ">"
+filter_operators = [
+    ('ge ', '>='), ('le ', '<='), ('lt ', '<'), ('gt ', '>'), ('ne ', '!='), ('eq ', '='),
+    ('contains ', None), ('datestartswith ', None),
+]
+
+
+def split_filter_part(filter_part: str) -> tuple[str | None, str | None, object]:
+    """
+    Splits one DataTable filter expression ("{close} < 0.001") into column, operator and value.
+    """
+    for operators in filter_operators:
+        for operator in operators:
+            if operator is None or operator not in filter_part:
+                continue
+            name_part, value_part = filter_part.split(operator, 1)
+            name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+            value_part = value_part.strip()
+            if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+                value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+            elif operator in ('contains ', 'datestartswith '):
+                value = value_part
+            else:
+                try:
+                    value = float(value_part)
+                except ValueError:
+                    value = value_part
+
+            return name, operators[0].strip(), value
+    return None, None, None
+
+
+def apply_filter_query(data: pd.DataFrame, filter_query: str | None) -> pd.DataFrame:
+    """
+    Applies a DataTable filter_query (expressions joined by " && ") to a view.
+    """
+    if not filter_query:
+        return data
+
+    mask = pd.Series(True, index=data.index)
+    for filter_part in filter_query.split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in data.columns:
+            continue
+        values = data[column]
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            try:
+                mask &= getattr(values, operator)(value)
+            except TypeError:
+                # e.g. "{symbol_ticker} > 5", nothing matches
+                mask &= False
+        elif operator == 'contains':
+            mask &= values.astype(str).str.contains(str(value), case=False, regex=False, na=False)
+        elif operator == 'datestartswith':
+            mask &= values.astype(str).str.startswith(str(value), na=False)
+    return data[mask]
+
+
+def page_market_data(data: pd.DataFrame, columns: list[str], page_current: int, page_size: int,
+                     filter_query: str | None = None) -> tuple[list[dict], int, int]:
+    """
+    Filters a (sorted) view and cuts out one page of the selected columns for a DataTable.
+
+    Returns:
+    Tuple[list[dict], int, int]: the page as records, the number of pages and the number of matching rows.
+    """
+    columns = [col for col in columns if col in data.columns]
+    filtered = apply_filter_query(data, filter_query)
+
+    rows = len(filtered)
+    page_count = max(-(-rows // page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+    page = filtered.iloc[page_current * page_size:(page_current + 1) * page_size][columns]
+    return page.to_dict('records'), page_count, rows
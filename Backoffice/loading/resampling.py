@@ -0,0 +1,189 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+# Timeframe -> (bar length, origin) in seconds. Weekly bars start on Monday 00:00 UTC (1970-01-05).
+timeframes = {
+    '1h': (3600, 0),
+    '4h': (4 * 3600, 0),
+    '1d': (86400, 0),
+    '1w': (7 * 86400, 4 * 86400),
+}
+
+# Column -> aggregation of the hourly rows inside a bar
+resample_rules = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume_24h': 'last',
+    'market_cap': 'last',
+    'circulating_supply': 'last',
+    'sentiment': 'mean',
+    'contributors_active': 'mean',
+    'contributors_created': 'sum',
+    'posts_active': 'mean',
+    'posts_created': 'sum',
+    'interactions': 'sum',
+    'social_dominance': 'mean',
+    'galaxy_score': 'mean',
+    'volatility': 'last',
+    'alt_rank': 'last',
+    'spam': 'sum',
+}
+
+# Hours before the previous watermark that are aggregated again, matches SymbolHistoryCache.refetch_hours
+revise_hours = 24
+
+
+def bar_start(time_unix, timeframe: str):
+    """
+    Returns the start (unix seconds) of the bar containing time_unix. Works on scalars and arrays.
+    """
+    seconds, origin = timeframes[timeframe]
+    return (time_unix - origin) // seconds * seconds + origin
+
+
+def resample_symbol_data(data: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Aggregates hourly read_symbol_data rows into bars of the given timeframe.
+
+    Bars are contiguous runs of the sorted rows, so every rule is one NumPy reduceat over
+    the 2D block of its columns. NaNs are skipped like in pandas; a bar without any value
+    in a column gets NaN.
+
+    Args:
+    data (pd.DataFrame): Hourly rows of one symbol, sorted by time_unix.
+    timeframe (str): One of the keys of timeframes.
+
+    Returns:
+    pd.DataFrame: One row per bar with symbol_id, time_unix (bar start), datetime, hours
+    (hourly rows in the bar) and the columns of resample_rules.
+    """
+    columns = ['symbol_id', 'time_unix', 'datetime', 'hours'] + list(resample_rules)
+    if data.empty:
+        return pd.DataFrame(columns=columns)
+
+    buckets = bar_start(data['time_unix'].to_numpy(dtype='int64'), timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+
+    by_rule = {}
+    for col, rule in resample_rules.items():
+        if col in data.columns:
+            by_rule.setdefault(rule, []).append(col)
+
+    bars = {
+        'symbol_id': np.repeat(data['symbol_id'].iloc[0], len(starts)),
+        'time_unix': buckets[starts],
+        'datetime': pd.to_datetime(buckets[starts], unit='s'),
+        'hours': ends - starts,
+    }
+    for rule, cols in by_rule.items():
+        values = data[cols].to_numpy(dtype='float64')
+        present = ~np.isnan(values)
+        counts = np.add.reduceat(present, starts, axis=0)
+
+        if rule == 'max':
+            result = np.fmax.reduceat(values, starts, axis=0)
+        elif rule == 'min':
+            result = np.fmin.reduceat(values, starts, axis=0)
+        elif rule in ('sum', 'mean'):
+            result = np.add.reduceat(np.where(present, values, 0), starts, axis=0)
+            if rule == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result = result / counts
+        else:
+            # Position of the first / last non-missing value inside each bar
+            positions = np.arange(len(values))[:, None]
+            if rule == 'first':
+                index = np.minimum.reduceat(np.where(present, positions, len(values)), starts, axis=0)
+            else:
+                index = np.maximum.reduceat(np.where(present, positions, -1), starts, axis=0)
+            result = np.take_along_axis(values, np.clip(index, 0, len(values) - 1), axis=0)
+
+        result = np.where(counts > 0, result, np.nan)
+        for i, col in enumerate(cols):
+            bars[col] = result[:, i]
+
+    return pd.DataFrame(bars).reindex(columns=columns)
+
+
+class ResampleCache:
+    """
+    Cache of resampled bars per (symbol_id, timeframe), kept in LRU order.
+
+    history returns the hourly frame of a symbol (e.g. SymbolHistoryCache.get). When it
+    holds hours newer than the cached watermark, only the bars from
+    bar_start(watermark - revise_hours) on are aggregated again and replace the cached tail;
+    older bars are kept as they are.
+    """
+
+    def __init__(self, history: Callable[[int], pd.DataFrame], max_entries: int = 512,
+                 revise_hours: int = revise_hours):
+        self.history = history
+        self.max_entries = max_entries
+        self.revise_seconds = revise_hours * 3600
+
+        self._entries = OrderedDict()  # (symbol_id, timeframe) -> (bars, watermark)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.incremental = 0
+        self.full = 0
+
+    def get(self, symbol_id: int, timeframe: str) -> pd.DataFrame:
+        """
+        Returns the bars of symbol_id for timeframe, updated with any new hourly rows.
+        """
+        if timeframe not in timeframes:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+
+        key = (int(symbol_id), timeframe)
+        data = self.history(symbol_id)
+        if data.empty:
+            return resample_symbol_data(data, timeframe)
+        if not data['time_unix'].is_monotonic_increasing:
+            data = data.sort_values(by='time_unix', kind='stable')
+        watermark = int(data['time_unix'].iloc[-1])
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry[1] == watermark:
+            with self._lock:
+                self.hits += 1
+            return entry[0]
+
+        if entry is None:
+            bars = resample_symbol_data(data, timeframe)
+            counter = 'full'
+        else:
+            cached_bars, cached_watermark = entry
+            cutoff = bar_start(cached_watermark - self.revise_seconds, timeframe)
+            start = data['time_unix'].searchsorted(cutoff, side='left')
+            tail = resample_symbol_data(data.iloc[start:], timeframe)
+            bars = pd.concat([cached_bars[cached_bars['time_unix'] < cutoff], tail], ignore_index=True)
+            counter = 'incremental'
+
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self._entries[key] = (bars, watermark)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return bars
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "incremental": self.incremental,
+                "full": self.full,
+            }
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import pandas as pd
+
+
+# Memory budget for cached symbol histories
+symbol_cache_max_bytes = 512 * 1024 ** 2
+
+# Hours before the watermark that are read again on every refresh, recent buckets may still be revised
+refetch_hours = 24
+
+
+def frame_bytes(data: pd.DataFrame) -> int:
+    return int(data.memory_usage(index=True, deep=True).sum())
+
+
+class SymbolHistoryCache:
+    """
+    Bounded LRU cache of per-symbol history frames (read_symbol_data output).
+
+    The first request for a symbol reads its whole history. Later requests only read
+    rows newer than the cached watermark (max time_unix) minus refetch_hours, replace
+    the overlapping rows and append the rest. Least recently used symbols are evicted
+    once the cached frames exceed max_bytes. Returned frames are shared, do not modify them.
+    """
+
+    def __init__(self, loader: Callable[[int, int | None], pd.DataFrame],
+                 max_bytes: int = symbol_cache_max_bytes, refetch_hours: int = refetch_hours):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.refetch_seconds = refetch_hours * 3600
+
+        self._entries = OrderedDict()  # symbol_id -> (data, watermark, bytes)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rows_fetched = 0
+
+    def get(self, symbol_id: int) -> pd.DataFrame:
+        """
+        Returns the history of symbol_id, topped up with rows loaded since the last call.
+        """
+        symbol_id = int(symbol_id)
+        with self._lock:
+            entry = self._entries.get(symbol_id)
+            if entry is not None:
+                self._entries.move_to_end(symbol_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is None:
+            data = self.loader(symbol_id, None)
+        else:
+            cached, watermark, _ = entry
+            since = watermark - self.refetch_seconds
+            new_rows = self.loader(symbol_id, since)
+            data = pd.concat([cached[cached['time_unix'] <= since], new_rows], ignore_index=True) \
+                if not new_rows.empty else cached
+
+        if data.empty:
+            return data
+
+        with self._lock:
+            self.rows_fetched += len(data) if entry is None else len(new_rows)
+            if entry is None or data is not entry[0]:
+                self._store(symbol_id, data)
+        return data
+
+    def _store(self, symbol_id: int, data: pd.DataFrame) -> None:
+        previous = self._entries.pop(symbol_id, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+
+        size = frame_bytes(data)
+        self._entries[symbol_id] = (data, int(data['time_unix'].max()), size)
+        self._bytes += size
+
+        # Keep at least the symbol just stored, even when it alone is over budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def invalidate(self, symbol_id: int | None = None) -> None:
+        """
+        Drops one symbol, or everything when symbol_id is None.
+        """
+        with self._lock:
+            if symbol_id is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(int(symbol_id), None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counts, hit rate, evictions, rows read from the database and cache memory.
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "rows_fetched": self.rows_fetched,
+            }
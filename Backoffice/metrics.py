@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Upper bounds (seconds) of the latency histogram buckets, +Inf is implicit
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# File sink in Prometheus text format (node_exporter textfile collector style), None disables it
+metrics_file = os.environ.get("LANDING_METRICS_FILE", os.path.join(os.path.dirname(__file__), 'landing', 'metrics.prom'))
+
+# Port of the /metrics HTTP endpoint, 0 disables it
+metrics_port = int(os.environ.get("LANDING_METRICS_PORT", "0"))
+
+metric_help = {
+    "landing_stage_seconds": ("histogram", "Wall-clock time per landing stage (fetch, decode, parse, save, dump, limiter_wait)."),
+    "landing_requests_total": ("counter", "LunarCrush requests by key and whether the cache answered."),
+    "landing_results_total": ("counter", "Results by stage and result code (1 ok, 2 no data, 9000-9999 errors, HTTP status)."),
+    "landing_rows_total": ("counter", "Rows handled by stage: fetched, saved, inserted, updated, skipped."),
+    "landing_response_bytes_total": ("counter", "Response body bytes read from LunarCrush or the cache."),
+    "landing_quota_used": ("gauge", "Requests counted by the rate limiter in the current window."),
+    "landing_quota_limit": ("gauge", "Request limit of the window."),
+    "landing_summary_refresh_seconds": ("histogram", "Time to refresh a summary table, incremental or full."),
+    "landing_summary_rows_total": ("counter", "Rows written to a summary table by its refreshes."),
+    "landing_summary_refreshed_at": ("gauge", "Unix time of the last refresh of a summary table."),
+    "landing_db_pool_connections": ("gauge", "Connections of an engine's pool by state: size, checked_in, checked_out, overflow."),
+    "landing_db_pool_checkouts_total": ("counter", "Connections checked out of an engine's pool."),
+    "landing_db_pool_checkout_wait_seconds": ("gauge", "Average and longest wait for a pooled connection."),
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = latency_buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms with Prometheus text rendering.
+
+    Metrics are keyed by name and a sorted tuple of label pairs. Everything is
+    guarded by one lock; updates are a dict lookup and an add, cheap enough
+    for every request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value).lower() if isinstance(value, bool) else str(value))
+                                  for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Observes the duration of the with block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), value in self._gauges.items():
+                series.setdefault(name, []).append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), histogram in self._histograms.items():
+                lines = series.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+
+        output = []
+        for name in sorted(series):
+            metric_type, help_text = metric_help.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(series[name])
+        return "\n".join(output) + "\n"
+
+    def write(self, path: str | None = metrics_file) -> None:
+        """
+        Writes the rendered metrics to path, atomically so collectors never read a partial file.
+        """
+        if not path:
+            return
+        temp_file = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(self.render())
+        os.replace(temp_file, path)
+
+
+_registry = MetricsRegistry()
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the process-wide MetricsRegistry.
+    """
+    return _registry
+
+
+def start_metrics_server(port: int = metrics_port) -> ThreadingHTTPServer | None:
+    """
+    Serves the registry at http://<host>:port/metrics from a daemon thread. Port 0 does nothing.
+    """
+    global _server
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            body = _registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
+
+
+def record_quota(limiter) -> None:
+    """
+    Publishes the rate limiter's usage and limits as gauges, per key for a KeyPool.
+    """
+    key_limiters = getattr(limiter, 'limiters', [limiter])
+    usages = limiter.usage_by_key() if hasattr(limiter, 'usage_by_key') else {limiter.key_name: limiter.usage()}
+    for key_limiter in key_limiters:
+        usage = usages[key_limiter.key_name]
+        for window, limit in key_limiter.limits.items():
+            _registry.set("landing_quota_used", usage[window], key_name=key_limiter.key_name, window=window)
+            if limit is not None:
+                _registry.set("landing_quota_limit", limit, key_name=key_limiter.key_name, window=window)
+
+
+def record_pool_stats(pool_stats: dict) -> None:
+    """
+    Publishes connection pool usage (db.read_pool_stats) as gauges per engine role.
+    """
+    for role, stats in pool_stats.items():
+        for state in ("size", "checked_in", "checked_out", "overflow"):
+            _registry.set("landing_db_pool_connections", stats[state], role=role, state=state)
+        _registry.set("landing_db_pool_checkouts_total", stats["checkouts"], role=role)
+        _registry.set("landing_db_pool_checkout_wait_seconds", stats["checkout_wait_avg"], role=role, stat="avg")
+        _registry.set("landing_db_pool_checkout_wait_seconds", stats["checkout_wait_max"], role=role, stat="max")
@@ -0,0 +1,306 @@
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+try:
+    # Optional: the mirror is disabled without pyarrow
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pa_fs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+try:
+    # Optional: locks partitions across processes (backfill workers), threads only without it
+    import fcntl
+except ImportError:
+    fcntl = None
+from sqlalchemy import text
+
+from db import get_engine
+
+
+# Columnar copy of landing.lunar_data: <mirror_dir>/symbol_id=<id>/year=<yyyy>/data.parquet
+mirror_dir = os.environ.get("LUNAR_MIRROR_DIR", os.path.join(os.path.dirname(__file__), 'mirror', 'lunar_data'))
+
+# Opt-in: LUNAR_MIRROR=on keeps the mirror current after every merge
+mirror_enabled = pa is not None and os.environ.get("LUNAR_MIRROR", "off") == "on"
+
+# Same layout as dash_data_functions.read_symbol_data, so either backend can serve it
+mirror_query = text("""
+    SELECT
+        ld.symbol_id,
+        s.symbol AS symbol_ticker,
+        s.name AS symbol_name,
+        ld.datetime,
+        ld.time_unix,
+        ld.open,
+        ld.high,
+        ld.low,
+        ld.close,
+        ld.volume_24h,
+        ld.market_cap,
+        ld.circulating_supply,
+        ld.sentiment,
+        ld.contributors_active,
+        ld.contributors_created,
+        ld.posts_active,
+        ld.posts_created,
+        ld.interactions,
+        ld.social_dominance,
+        ld.galaxy_score,
+        ld.volatility,
+        ld.alt_rank,
+        ld.spam
+    FROM landing.lunar_data ld
+    LEFT JOIN public.symbols s ON ld.symbol_id = s.id
+    WHERE ld.symbol_id = :symbol_id
+      AND ld.datetime >= make_timestamp(:year, 1, 1, 0, 0, 0)
+      AND ld.datetime < make_timestamp(:year + 1, 1, 1, 0, 0, 0)
+    ORDER BY ld.datetime ASC
+""")
+
+# Columns of landing.lunar_data stored as double precision, the other numeric columns are bigint
+double_columns = ['open', 'high', 'low', 'close', 'volume_24h', 'market_cap', 'circulating_supply',
+                  'sentiment', 'social_dominance', 'galaxy_score', 'volatility']
+
+# One schema for every file, whichever path wrote it; symbol_id comes from the directory name
+mirror_schema = pa.schema(
+    [('symbol_ticker', pa.string()), ('symbol_name', pa.string()), ('datetime', pa.timestamp('us')),
+     ('time_unix', pa.int64())]
+    + [(col, pa.float64() if col in double_columns else pa.int64())
+       for col in ['open', 'high', 'low', 'close', 'volume_24h', 'market_cap', 'circulating_supply', 'sentiment',
+                   'contributors_active', 'contributors_created', 'posts_active', 'posts_created', 'interactions',
+                   'social_dominance', 'galaxy_score', 'volatility', 'alt_rank', 'spam']]
+) if pa is not None else None
+
+_write_lock = threading.Lock()
+
+
+def partition_file(symbol_id: int, year: int, path: str = mirror_dir) -> str:
+    return os.path.join(path, f"symbol_id={int(symbol_id)}", f"year={int(year)}", "data.parquet")
+
+
+@contextmanager
+def partition_lock(file: str):
+    """
+    Holds the partition's write lock, in this process and, with fcntl, in every other one.
+    Lock and temporary files start with '.', which dataset discovery skips.
+    """
+    with _write_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(os.path.dirname(file), ".lock"), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_partition(data: pd.DataFrame, file: str) -> None:
+    """
+    Swaps in a new partition file: written to a temporary name first, readers never see a partial file.
+    """
+    table = pa.Table.from_pandas(data.reindex(columns=mirror_schema.names), schema=mirror_schema, preserve_index=False)
+    temp_file = os.path.join(os.path.dirname(file), f".{os.path.basename(file)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    pq.write_table(table, temp_file, compression='zstd')
+    os.replace(temp_file, file)
+
+
+def read_partitions(connection, source_table: str) -> list[tuple[int, int]]:
+    """
+    Returns the (symbol_id, year) partitions touched by the rows of source_table,
+    e.g. landing.buffer_lunar_data before it is merged and truncated.
+    """
+    query = text(f"SELECT DISTINCT symbol_id, extract(year FROM datetime)::int FROM {source_table}")
+    return [(int(symbol_id), int(year)) for symbol_id, year in connection.execute(query).fetchall()]
+
+
+def export_partitions(partitions, path: str = mirror_dir) -> tuple[int, dict]:
+    """
+    Rewrites the given (symbol_id, year) partitions of the mirror from landing.lunar_data.
+    Each file is written to a temporary name and swapped in, readers never see a partial file.
+
+    Args:
+    partitions: Iterable of (symbol_id, year).
+    path (str): Mirror root directory.
+
+    Returns:
+    Tuple[int, dict]: result code (9010 on error) and partitions, rows and elapsed_time.
+    """
+    if not mirror_enabled:
+        return 2, {}
+
+    start_time = datetime.now()
+    partitions = sorted(set((int(symbol_id), int(year)) for symbol_id, year in partitions))
+    rows = 0
+    try:
+        engine = get_engine("ingestion")
+        with engine.connect() as connection:
+            for symbol_id, year in partitions:
+                data = pd.read_sql_query(mirror_query, connection, params={'symbol_id': symbol_id, 'year': year})
+                file = partition_file(symbol_id, year, path)
+                os.makedirs(os.path.dirname(file), exist_ok=True)
+
+                with partition_lock(file):
+                    if data.empty:
+                        if os.path.exists(file):
+                            os.remove(file)
+                        continue
+                    write_partition(data, file)
+                rows += len(data)
+    except Exception as e:
+        print(f"Error exporting lunar_data mirror: {e}")
+        return 9010, {}
+
+    return 1, {"partitions": len(partitions), "rows": rows,
+               "elapsed_time": (datetime.now() - start_time).total_seconds()}
+
+
+def update_partitions(data_df: pd.DataFrame, path: str = mirror_dir) -> tuple[int, dict]:
+    """
+    Writes rows just merged into landing.lunar_data (e.g. a get_lunar_data frame) into their
+    (symbol_id, year) partitions. Each touched file is read locally, the new rows replace
+    the same hours, and the file is swapped in. Postgres is only asked for the ticker and
+    name of symbols that have no file yet, so keeping the mirror current costs the
+    database next to nothing. export_partitions rebuilds partitions from Postgres instead.
+
+    Args:
+    data_df (pd.DataFrame): Rows in the landing.lunar_data layout.
+    path (str): Mirror root directory.
+
+    Returns:
+    Tuple[int, dict]: result code (9010 on error) and partitions, rows and elapsed_time.
+    """
+    if not mirror_enabled:
+        return 2, {}
+    if data_df.empty:
+        return 1, {"partitions": 0, "rows": 0, "elapsed_time": 0.0}
+
+    start_time = datetime.now()
+    data_df = data_df.assign(year=data_df['datetime'].dt.year)
+    names = {}
+    rows = 0
+    try:
+        groups = list(data_df.groupby(['symbol_id', 'year'], sort=True))
+        for (symbol_id, year), rows_df in groups:
+            file = partition_file(symbol_id, year, path)
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+
+            with partition_lock(file):
+                existing = pq.read_table(file).to_pandas() if os.path.exists(file) else pd.DataFrame()
+
+                if not existing.empty:
+                    ticker, name = existing['symbol_ticker'].iloc[-1], existing['symbol_name'].iloc[-1]
+                else:
+                    if symbol_id not in names:
+                        names[symbol_id] = read_symbol_names(int(symbol_id))
+                    ticker, name = names[symbol_id]
+                rows_df = rows_df.drop(columns=['symbol_id', 'year']).assign(symbol_ticker=ticker, symbol_name=name)
+
+                data = pd.concat([existing, rows_df], ignore_index=True) if not existing.empty else rows_df
+                data = (data.drop_duplicates(subset=['time_unix'], keep='last')
+                            .sort_values(by='time_unix', kind='stable'))
+                write_partition(data, file)
+            rows += len(rows_df)
+    except Exception as e:
+        print(f"Error updating lunar_data mirror: {e}")
+        return 9010, {}
+
+    return 1, {"partitions": len(groups), "rows": rows,
+               "elapsed_time": (datetime.now() - start_time).total_seconds()}
+
+
+def read_symbol_names(symbol_id: int) -> tuple[str | None, str | None]:
+    """
+    Returns the ticker and name of a symbol from public.symbols, (None, None) when unknown.
+    """
+    engine = get_engine("ingestion")
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT symbol, name FROM public.symbols WHERE id = :symbol_id"),
+                                 {'symbol_id': symbol_id}).first()
+    return (row[0], row[1]) if row is not None else (None, None)
+
+
+def export_all(path: str = mirror_dir) -> tuple[int, dict]:
+    """
+    Builds the whole mirror, e.g. the first time or after a schema change.
+    """
+    try:
+        engine = get_engine("ingestion")
+        with engine.connect() as connection:
+            partitions = read_partitions(connection, "landing.lunar_data")
+    except Exception as e:
+        print(f"Error reading lunar_data partitions: {e}")
+        return 9010, {}
+    return export_partitions(partitions, path)
+
+
+def read_mirror(symbol_ids: list[int] | None = None, columns: list[str] | None = None,
+                start_unix: int | None = None, end_unix: int | None = None,
+                path: str = mirror_dir) -> pd.DataFrame:
+    """
+    Reads the mirror with column projection and predicate pushdown: symbol and year
+    partitions outside the request are never opened, row groups outside the time
+    range are skipped by their statistics. Files are memory mapped, so repeated
+    scans are served from the page cache.
+
+    Args:
+    symbol_ids (list[int]): Symbols to read, all when None.
+    columns (list[str]): Columns to return, all when None.
+    start_unix (int): Only rows with time_unix >= start_unix.
+    end_unix (int): Only rows with time_unix <= end_unix.
+
+    Returns:
+    pd.DataFrame: Matching rows ordered by symbol_id and time_unix.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to read the lunar_data mirror")
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+
+    dataset = ds.dataset(path, format='parquet', partitioning='hive',
+                         filesystem=pa_fs.LocalFileSystem(use_mmap=True))
+    # Files written before mirror_schema may hold integer columns as double, read them all alike
+    dataset = dataset.replace_schema(mirror_schema.append(pa.field('symbol_id', pa.int32())).append(pa.field('year', pa.int32())))
+
+    conditions = []
+    if symbol_ids is not None:
+        conditions.append(ds.field('symbol_id').isin([int(symbol_id) for symbol_id in symbol_ids]))
+    if start_unix is not None:
+        # One year of slack each way, datetime (the partition key) may be local time
+        conditions.append(ds.field('year') >= datetime.fromtimestamp(start_unix, timezone.utc).year - 1)
+        conditions.append(ds.field('time_unix') >= int(start_unix))
+    if end_unix is not None:
+        conditions.append(ds.field('year') <= datetime.fromtimestamp(end_unix, timezone.utc).year + 1)
+        conditions.append(ds.field('time_unix') <= int(end_unix))
+
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    projection = None
+    if columns is not None:
+        sort_columns = [col for col in ['symbol_id', 'time_unix'] if col not in columns]
+        projection = list(columns) + sort_columns
+
+    table = dataset.to_table(columns=projection, filter=condition)
+    data = table.to_pandas()
+    if data.empty:
+        return data.reindex(columns=columns) if columns is not None else data
+
+    data['symbol_id'] = data['symbol_id'].astype('int64')
+    data = data.sort_values(by=['symbol_id', 'time_unix'], kind='stable').reset_index(drop=True)
+    if columns is None:
+        columns = ['symbol_id'] + [col for col in data.columns if col not in ('symbol_id', 'year')]
+    return data[columns]
+
+
+if __name__ == "__main__":
+    # python parquet_mirror.py  -> (re)builds the whole mirror
+    result_code, report = export_all()
+    print(result_code, report)
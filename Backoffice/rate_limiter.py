@@ -0,0 +1,373 @@
+import os
+import threading
+import time
+from bisect import bisect_right
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+
+from config import lunar_key
+from db import get_engine
+from request_logger import api_request_logs, get_api_request_writer
+
+
+# Keys of config.lunar_key used for landing, all of them unless LUNAR_KEYS=key_a,key_b
+lunar_key_names = [name for name in os.environ.get("LUNAR_KEYS", ",".join(lunar_key)).split(",") if name]
+
+# Key the last KeyPool.acquire / try_acquire picked in this thread or task, read by LunarClient.get_json
+current_key = ContextVar("current_key", default="key_outlook")
+
+# True when SharedKeyPool already logged the granted request, LunarClient.get_json then skips register_api_request
+request_logged = ContextVar("request_logged", default=False)
+
+# Advisory lock serializing the quota checks of every SharedKeyPool, on every host
+quota_lock_id = 0x6c756e6172  # "lunar"
+
+
+class RateLimiter:
+    """
+    In-process sliding window rate limiter for a single API key.
+
+    The limiter is seeded once from public.api_request_logs and afterwards keeps
+    the request timestamps in memory, so checking the quota costs no DB round trip.
+    Limits are enforced over minute, hour and day windows; a limit of None disables
+    that window.
+
+    Usage:
+    limiter = RateLimiter("key_outlook", minute_limit=10, day_limit=2000)
+    limiter.seed()
+    limiter.acquire()  # sleeps exactly until a slot is free, then records the request
+    """
+
+    windows = {
+        "minute": 60,
+        "hour": 3600,
+        "day": 86400
+    }
+
+    def __init__(self, key_name: str = "key_outlook", minute_limit: int | None = 10,
+                 hour_limit: int | None = None, day_limit: int | None = 2000):
+        self.key_name = key_name
+        self.limits = {
+            "minute": minute_limit,
+            "hour": hour_limit,
+            "day": day_limit
+        }
+        self._timestamps = []  # sorted unix timestamps of requests within the last day
+        self._lock = threading.Lock()
+
+    def seed(self) -> None:
+        """
+        Loads the request timestamps of the last day for this key from public.api_request_logs.
+        Requests still queued by this process are flushed first so they are counted.
+        """
+        get_api_request_writer().flush()
+        since = datetime.now() - timedelta(seconds=self.windows["day"])
+
+        try:
+            engine = get_engine("ingestion")
+            with engine.connect() as connection:
+                query = text("""
+                    SELECT timestamp
+                    FROM public.api_request_logs
+                    WHERE key_name = :key_name AND timestamp > :since
+                    ORDER BY timestamp ASC
+                """)
+                result = connection.execute(query, {'key_name': self.key_name, 'since': since}).fetchall()
+        except Exception as e:
+            raise RuntimeError(f"Failed to seed rate limiter: {e}")
+
+        with self._lock:
+            self._timestamps = [row[0].timestamp() for row in result]
+
+    def _prune(self, now: float) -> None:
+        # Only the longest window needs history
+        cutoff = now - self.windows["day"]
+        del self._timestamps[:bisect_right(self._timestamps, cutoff)]
+
+    def _wait_time(self, now: float) -> float:
+        wait = 0.0
+        for window, limit in self.limits.items():
+            if limit is None:
+                continue
+            size = self.windows[window]
+            first = bisect_right(self._timestamps, now - size)
+            count = len(self._timestamps) - first
+            if count >= limit:
+                # The window frees up once enough of its oldest requests fall out of it
+                release_at = self._timestamps[first + count - limit] + size
+                wait = max(wait, release_at - now)
+        return wait
+
+    def usage(self) -> dict:
+        """
+        Returns the number of requests made in each window: {'minute': n, 'hour': n, 'day': n}.
+        """
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            return {
+                window: len(self._timestamps) - bisect_right(self._timestamps, now - size)
+                for window, size in self.windows.items()
+            }
+
+    def wait_time(self) -> float:
+        """
+        Returns the exact number of seconds until the next request is allowed (0.0 if allowed now).
+        """
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            return self._wait_time(now)
+
+    def headroom(self) -> float:
+        """
+        Returns the share (0..1) of the tightest window that is still free, 1.0 without limits.
+        """
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            free = 1.0
+            for window, limit in self.limits.items():
+                if limit is None:
+                    continue
+                count = len(self._timestamps) - bisect_right(self._timestamps, now - self.windows[window])
+                free = min(free, max(limit - count, 0) / limit)
+            return free
+
+    def try_acquire(self) -> float:
+        """
+        Records a request if a slot is free.
+
+        Returns:
+        float: 0.0 when the request was recorded, otherwise the seconds until the next free slot.
+        """
+        with self._lock:
+            now = time.time()
+            self._prune(now)
+            wait = self._wait_time(now)
+            if wait <= 0:
+                self._timestamps.append(now)
+            return wait
+
+    def try_acquire_key(self) -> tuple[str | None, float]:
+        """
+        try_acquire with the KeyPool signature: (key_name, 0.0) when recorded, else (None, wait).
+        """
+        wait = self.try_acquire()
+        return (self.key_name, 0.0) if wait <= 0 else (None, wait)
+
+    def acquire(self) -> float:
+        """
+        Blocks until a slot is free and records the request.
+
+        Returns:
+        float: Total seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class KeyPool:
+    """
+    Several LunarCrush keys behind the RateLimiter interface, one RateLimiter per key.
+
+    Every acquire picks the key with the most headroom (the largest free share of its
+    tightest window), so requests spread evenly and throughput grows with the number
+    of keys. The picked key is stored in current_key for the request that follows;
+    usage() and limits are summed over the keys.
+
+    Usage:
+    pool = KeyPool(minute_limit=10, day_limit=2000)  # limits per key, config.lunar_key may override them
+    pool.seed()
+    pool.acquire()
+    get_lunar_data(...)  # sent with current_key.get()
+    """
+
+    key_name = "pool"
+
+    def __init__(self, key_names: list[str] | None = None, minute_limit: int | None = 10,
+                 hour_limit: int | None = None, day_limit: int | None = 2000):
+        defaults = {"minute_limit": minute_limit, "hour_limit": hour_limit, "day_limit": day_limit}
+        self.limiters = [
+            RateLimiter(name, **{limit: lunar_key.get(name, {}).get(limit, default) for limit, default in defaults.items()})
+            for name in (key_names or lunar_key_names)
+        ]
+        if not self.limiters:
+            raise ValueError("KeyPool needs at least one key")
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limits(self) -> dict:
+        # None (unlimited) as soon as one key has no limit for the window
+        return {
+            window: None if any(limiter.limits[window] is None for limiter in self.limiters)
+            else sum(limiter.limits[window] for limiter in self.limiters)
+            for window in RateLimiter.windows
+        }
+
+    def seed(self) -> None:
+        for limiter in self.limiters:
+            limiter.seed()
+
+    def usage(self) -> dict:
+        usages = [limiter.usage() for limiter in self.limiters]
+        return {window: sum(usage[window] for usage in usages) for window in RateLimiter.windows}
+
+    def usage_by_key(self) -> dict:
+        return {limiter.key_name: limiter.usage() for limiter in self.limiters}
+
+    def wait_time(self) -> float:
+        return min(limiter.wait_time() for limiter in self.limiters)
+
+    def _rotated(self) -> list[RateLimiter]:
+        # Rotate first, so keys with equal headroom (e.g. no limits) take turns
+        self._next = (self._next + 1) % len(self.limiters)
+        return self.limiters[self._next:] + self.limiters[:self._next]
+
+    def try_acquire_key(self) -> tuple[str | None, float]:
+        """
+        Records a request on the key with the most headroom.
+
+        Returns:
+        Tuple[str | None, float]: the key and 0.0, or None and the seconds until any key has a free slot.
+        """
+        with self._lock:
+            for limiter in sorted(self._rotated(), key=lambda limiter: limiter.headroom(), reverse=True):
+                if limiter.try_acquire() <= 0:
+                    return limiter.key_name, 0.0
+            return None, self.wait_time()
+
+    def try_acquire(self) -> float:
+        key_name, wait = self.try_acquire_key()
+        if key_name is not None:
+            current_key.set(key_name)
+        return wait
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class SharedKeyPool(KeyPool):
+    """
+    KeyPool whose quota is shared by every process and host writing to the same
+    public.api_request_logs, e.g. the workers of the sharded backfill.
+
+    Each acquire takes a Postgres advisory lock, counts the requests per key and window
+    in api_request_logs, and logs the request it grants in the same transaction, so two
+    workers can never both take the last slot. That costs one round trip per request,
+    nothing next to the API call. The granted request is logged already: request_logged
+    tells LunarClient.get_json not to register it again.
+    """
+
+    def seed(self) -> None:
+        # Nothing to load, every acquire reads the log; only make this process's queued requests count
+        get_api_request_writer().flush()
+
+    def _read_usage(self, connection, now: datetime) -> dict:
+        query = text("""
+            SELECT
+                key_name,
+                count(*) FILTER (WHERE timestamp > :minute_ago) AS minute,
+                count(*) FILTER (WHERE timestamp > :hour_ago) AS hour,
+                count(*) AS day,
+                min(timestamp) FILTER (WHERE timestamp > :minute_ago) AS minute_oldest,
+                min(timestamp) FILTER (WHERE timestamp > :hour_ago) AS hour_oldest,
+                min(timestamp) AS day_oldest
+            FROM public.api_request_logs
+            WHERE key_name = ANY(:key_names) AND timestamp > :day_ago
+            GROUP BY key_name
+        """)
+        params = {f"{window}_ago": now - timedelta(seconds=size) for window, size in RateLimiter.windows.items()}
+        params['key_names'] = [limiter.key_name for limiter in self.limiters]
+        usage = {limiter.key_name: {window: 0 for window in RateLimiter.windows} for limiter in self.limiters}
+        for row in connection.execute(query, params).mappings():
+            usage[row['key_name']] = dict(row)
+        return usage
+
+    def usage_by_key(self) -> dict:
+        engine = get_engine("ingestion")
+        with engine.connect() as connection:
+            usage = self._read_usage(connection, datetime.now())
+        return {key_name: {window: key_usage[window] for window in RateLimiter.windows}
+                for key_name, key_usage in usage.items()}
+
+    def usage(self) -> dict:
+        usages = self.usage_by_key().values()
+        return {window: sum(usage[window] for usage in usages) for window in RateLimiter.windows}
+
+    def wait_time(self) -> float:
+        return self.try_acquire_key(reserve=False)[1]
+
+    def try_acquire_key(self, url: str | None = None, function_name: str = "backfill",
+                        reserve: bool = True) -> tuple[str | None, float]:
+        """
+        Grants and logs a request on the key with the most headroom across all processes.
+
+        Args:
+        url (str): URL that will be requested, logged with the grant.
+        function_name (str): Caller name logged with the grant.
+        reserve (bool): False only computes the wait, nothing is logged.
+
+        Returns:
+        Tuple[str | None, float]: the key and 0.0, or None and the seconds until a slot is
+        expected to free up (the oldest request of the full window leaves it; may be early).
+        """
+        now = datetime.now()
+        engine = get_engine("ingestion")
+        with self._lock, engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': quota_lock_id})
+            usage = self._read_usage(connection, now)
+
+            best, best_headroom, wait = None, -1.0, None
+            for limiter in self._rotated():
+                key_usage = usage[limiter.key_name]
+                key_wait, headroom = 0.0, 1.0
+                for window, limit in limiter.limits.items():
+                    if limit is None:
+                        continue
+                    count = key_usage[window]
+                    headroom = min(headroom, max(limit - count, 0) / limit)
+                    if count >= limit:
+                        release_at = key_usage[f"{window}_oldest"] + timedelta(seconds=RateLimiter.windows[window])
+                        key_wait = max(key_wait, (release_at - now).total_seconds())
+                if key_wait <= 0 and headroom > best_headroom:
+                    best, best_headroom = limiter.key_name, headroom
+                elif key_wait > 0:
+                    wait = key_wait if wait is None else min(wait, key_wait)
+
+            if best is None:
+                return None, max(wait or 0.0, 0.001)
+            if reserve:
+                connection.execute(insert(api_request_logs).values(
+                    service="LunarCrush", key_name=best, timestamp=now, function_name=function_name, url=url))
+            return best, 0.0
+
+    def try_acquire(self, url: str | None = None, function_name: str = "backfill") -> float:
+        key_name, wait = self.try_acquire_key(url, function_name)
+        if key_name is not None:
+            current_key.set(key_name)
+            request_logged.set(True)
+        return wait
+
+    def acquire(self, url: str | None = None, function_name: str = "backfill") -> float:
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(url, function_name)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
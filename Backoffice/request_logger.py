@@ -0,0 +1,230 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, table, column
+from sqlalchemy.exc import InterfaceError, OperationalError, StatementError
+
+from db import get_engine
+
+
+api_request_logs = table(
+    'api_request_logs',
+    column('service'),
+    column('key_name'),
+    column('timestamp'),
+    column('function_name'),
+    column('url'),
+    schema='public'
+)
+
+# Rows left after close() gave up, loaded back into the queue by the next writer
+spill_path = os.environ.get("API_REQUEST_LOG_SPILL", os.path.join(os.path.dirname(__file__), 'api_request_logs_spill.jsonl'))
+
+# Rows the database rejected on their own retries times, kept for inspection only
+quarantine_path = os.environ.get("API_REQUEST_LOG_QUARANTINE", os.path.join(os.path.dirname(__file__), 'api_request_logs_quarantine.jsonl'))
+
+
+def is_row_error(e: Exception) -> bool:
+    """
+    True when the database rejected the rows themselves, False when it could not be reached.
+    """
+    return (isinstance(e, StatementError) and not isinstance(e, (OperationalError, InterfaceError))
+            and not getattr(e, 'connection_invalidated', False))
+
+
+def append_rows(path: str, rows: list[dict]) -> None:
+    """
+    Appends api_request_logs rows to a JSON lines file.
+    """
+    with open(path, 'a', encoding='utf-8') as f:
+        for row in rows:
+            # datetime as str(), which datetime.fromisoformat reads back
+            f.write(json.dumps(row, default=str) + "\n")
+
+
+def load_rows(path: str) -> list[dict]:
+    """
+    Reads rows written by append_rows and removes the file. The file is renamed first,
+    so of several processes starting at once only one loads it.
+    """
+    claimed = f"{path}.{os.getpid()}"
+    try:
+        os.replace(path, claimed)
+    except FileNotFoundError:
+        return []
+    with open(claimed, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    os.remove(claimed)
+    for row in rows:
+        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return rows
+
+
+class ApiRequestLogWriter:
+    """
+    Background writer for public.api_request_logs.
+
+    Records are queued with the timestamp of the request and written by a daemon
+    thread as one multi-row INSERT whenever batch_size records are waiting or
+    flush_interval seconds have passed. public.key_usage therefore lags by at most
+    flush_interval seconds.
+
+    When a batch fails its rows are written one by one, so a bad row cannot hold up
+    the others; a row failing on its own retries times goes to quarantine_path.
+    close() (registered with atexit) drains the queue before the process exits and
+    spills what it cannot write to spill_path, which the next writer loads again.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0, retries: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+
+        self._queue = queue.Queue()
+        self._pending = []  # [record, failures] taken from the queue but not yet committed
+        self._flush_lock = threading.Lock()
+        self._batch_ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        for record in load_rows(spill_path):
+            self._queue.put(record)
+        self._thread = threading.Thread(target=self._run, name="api-request-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, service: str, key_name: str, function_name: str, url: str) -> None:
+        """
+        Queues a request record. Never blocks on the database.
+        """
+        self._queue.put({
+            'service': service,
+            'key_name': key_name,
+            'timestamp': datetime.now(),
+            'function_name': function_name,
+            'url': url
+        })
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # Wake up on the timer or as soon as a full batch is waiting
+            self._batch_ready.wait(self.flush_interval)
+            self._batch_ready.clear()
+            try:
+                self.flush()
+            except RuntimeError as e:
+                print(e)
+
+    def flush(self) -> int:
+        """
+        Writes every queued record to public.api_request_logs.
+
+        Returns:
+        int: Number of rows written.
+        """
+        with self._flush_lock:
+            while True:
+                try:
+                    self._pending.append([self._queue.get_nowait(), 0])
+                except queue.Empty:
+                    break
+
+            if not self._pending:
+                return 0
+
+            records = [record for record, failures in self._pending]
+            try:
+                engine = get_engine("ingestion")
+                with engine.begin() as connection:
+                    for i in range(0, len(records), self.batch_size):
+                        connection.execute(insert(api_request_logs).values(records[i:i + self.batch_size]))
+                self._pending = []
+                return len(records)
+            except Exception as e:
+                error = e
+                if not is_row_error(e):
+                    # Keep the rows, the next flush retries them
+                    raise RuntimeError(f"Failed to write {len(records)} API request logs: {e}")
+
+            # Isolate the rows the batch failed on
+            written, failed, quarantined = 0, [], []
+            for i, (record, failures) in enumerate(self._pending):
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(insert(api_request_logs).values([record]))
+                    written += 1
+                except Exception as e:
+                    error = e
+                    if not is_row_error(e):
+                        failed.extend(self._pending[i:])
+                        break
+                    if failures + 1 >= self.retries:
+                        quarantined.append(record)
+                    else:
+                        failed.append([record, failures + 1])
+
+            self._pending = failed
+            if quarantined:
+                append_rows(quarantine_path, quarantined)
+                print(f"Quarantined {len(quarantined)} API request logs in {quarantine_path}: {error}")
+            if failed:
+                # Keep the rows, the next flush retries them
+                raise RuntimeError(f"Failed to write {len(failed)} API request logs: {error}")
+            return written
+
+    def close(self) -> None:
+        """
+        Stops the background thread and flushes everything that is still queued.
+        """
+        self._stop.set()
+        self._batch_ready.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.flush()
+                return
+            except RuntimeError as e:
+                print(e)
+                if attempt < self.retries:
+                    time.sleep(attempt)
+
+        # Nothing is dropped: the next writer loads the rows again
+        with self._flush_lock:
+            while True:
+                try:
+                    self._pending.append([self._queue.get_nowait(), 0])
+                except queue.Empty:
+                    break
+            append_rows(spill_path, [record for record, failures in self._pending])
+            print(f"Spilled {len(self._pending)} API request logs to {spill_path}")
+            self._pending = []
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_api_request_writer() -> ApiRequestLogWriter:
+    """
+    Returns the process-wide ApiRequestLogWriter, starting it on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ApiRequestLogWriter()
+            _writer.start()
+        return _writer
@@ -0,0 +1,26 @@
+-- Work items of the sharded backfill (landing/backfill_jobs.py): one row per planned
+-- get_lunar_data window. Workers on any host claim pending rows with FOR UPDATE SKIP LOCKED;
+-- rows left 'running' by a crashed worker are claimed again after the job timeout.
+CREATE TABLE IF NOT EXISTS landing.backfill_jobs (
+    job_id         bigserial PRIMARY KEY,
+    symbol_id      bigint    NOT NULL,
+    symbol_ticker  text,
+    start_unix     bigint    NOT NULL,
+    end_unix       bigint    NOT NULL,
+    hours_missing  integer   NOT NULL,
+    status         text      NOT NULL DEFAULT 'pending',  -- pending, running, done, failed
+    attempts       integer   NOT NULL DEFAULT 0,
+    worker         text,
+    claimed_at     timestamp,
+    finished_at    timestamp,
+    rows           integer,
+    result_code    integer,
+    UNIQUE (symbol_id, start_unix, end_unix)
+);
+
+CREATE INDEX IF NOT EXISTS backfill_jobs_status_idx
+    ON landing.backfill_jobs (status, symbol_id, start_unix);
+
+-- SharedKeyPool counts the requests of every worker per key and window from here
+CREATE INDEX IF NOT EXISTS api_request_logs_key_timestamp_idx
+    ON public.api_request_logs (key_name, timestamp);
@@ -0,0 +1,12 @@
+-- Windows already requested by the backfill, including the ones LunarCrush returned no data for.
+-- Read by backfill_planner.read_coverage so those windows are never fetched again.
+CREATE TABLE IF NOT EXISTS landing.backfill_windows (
+    symbol_id   bigint    NOT NULL,
+    start_unix  bigint    NOT NULL,
+    end_unix    bigint    NOT NULL,
+    rows        integer   NOT NULL,
+    fetched_at  timestamp NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS backfill_windows_symbol_idx
+    ON landing.backfill_windows (symbol_id, start_unix);
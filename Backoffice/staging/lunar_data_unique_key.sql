@@ -0,0 +1,17 @@
+-- Natural key for landing.lunar_data, required by merge_lunar_data (INSERT ... ON CONFLICT).
+-- datetime is derived from time_unix, it is in the index only because a unique index on a
+-- partitioned table has to contain the partition column.
+
+-- Remove duplicates written by the old append-only dump, keep the latest copy of every hour
+DELETE FROM landing.lunar_data a
+USING (
+    SELECT tableoid, ctid,
+           row_number() OVER (PARTITION BY symbol_id, time_unix ORDER BY tableoid, ctid DESC) AS rn
+    FROM landing.lunar_data
+) d
+WHERE a.tableoid = d.tableoid
+  AND a.ctid = d.ctid
+  AND d.rn > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS lunar_data_symbol_time_key
+    ON landing.lunar_data (symbol_id, time_unix, datetime);
@@ -0,0 +1,66 @@
+-- Replaces the materialized views market_data_summary_1_24 and lunar_data_etl with tables of the
+-- same name and columns. summary_refresh.refresh_summaries keeps them current from every merge
+-- into landing.lunar_data, per touched symbol, so they no longer need a full
+-- REFRESH MATERIALIZED VIEW. After include_etl changes run: python summary_refresh.py
+
+DROP MATERIALIZED VIEW IF EXISTS landing.market_data_summary_1_24;
+CREATE TABLE IF NOT EXISTS landing.market_data_summary_1_24 AS
+SELECT
+    ld.symbol_id,
+    s.symbol AS symbol_ticker,
+    s.name AS symbol_name,
+    ld.datetime,
+    ld.time_unix,
+    ld.open,
+    ld.high,
+    ld.low,
+    ld.close,
+    ld.volume_24h,
+    ld.market_cap,
+    ld.circulating_supply,
+    ld.sentiment,
+    ld.contributors_active,
+    ld.contributors_created,
+    ld.posts_active,
+    ld.posts_created,
+    ld.interactions,
+    ld.social_dominance,
+    ld.galaxy_score,
+    ld.volatility,
+    ld.alt_rank,
+    ld.spam
+FROM public.symbols s
+JOIN landing.lunar_data ld
+    ON ld.symbol_id = s.id
+   -- last_timestamp is double precision, cast so the (symbol_id, time_unix) index applies
+   AND ld.time_unix IN (s.last_timestamp::bigint, s.last_timestamp::bigint - 3600, s.last_timestamp::bigint - 86400);
+
+CREATE INDEX IF NOT EXISTS market_data_summary_1_24_symbol_idx
+    ON landing.market_data_summary_1_24 (symbol_id, time_unix);
+
+
+DROP MATERIALIZED VIEW IF EXISTS landing.lunar_data_etl;
+CREATE TABLE IF NOT EXISTS landing.lunar_data_etl AS
+SELECT s.symbol, ld.*
+FROM public.symbols s
+JOIN landing.lunar_data ld
+    ON ld.symbol_id = s.id
+   AND ld.datetime >= s.last_update - INTERVAL '72 hours'
+WHERE s.include_etl = TRUE;
+
+CREATE INDEX IF NOT EXISTS lunar_data_etl_symbol_idx
+    ON landing.lunar_data_etl (symbol_id, datetime);
+
+
+-- Cost of every refresh, one row per summary table and run
+CREATE TABLE IF NOT EXISTS landing.summary_refresh_log (
+    summary       text             NOT NULL,
+    mode          text             NOT NULL,
+    symbols       integer          NOT NULL,
+    rows          integer          NOT NULL,
+    elapsed_time  double precision NOT NULL,
+    refreshed_at  timestamp        NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS summary_refresh_log_summary_idx
+    ON landing.summary_refresh_log (summary, refreshed_at);
@@ -0,0 +1,51 @@
+-- Latest, 1h-before and 24h-before values per symbol for the Top Gainers leaderboards.
+-- Kept current by summary_refresh.refresh_symbol_changes in the same transaction as every
+-- merge into landing.lunar_data, only for the symbols the merge touched.
+CREATE TABLE IF NOT EXISTS landing.symbol_changes (
+    symbol_id               bigint           PRIMARY KEY,
+    time_unix               bigint           NOT NULL,
+    datetime                timestamp        NOT NULL,
+    close                   double precision,
+    close_1h                double precision,
+    close_24h               double precision,
+    posts_created           bigint,
+    posts_created_1h        bigint,
+    posts_created_24h       bigint,
+    interactions            bigint,
+    interactions_1h         bigint,
+    interactions_24h        bigint,
+    updated_at              timestamp        NOT NULL DEFAULT now(),
+
+    -- % change, NULL when the earlier hour is missing or zero
+    close_r_1h              double precision GENERATED ALWAYS AS ((close - close_1h) / NULLIF(close_1h, 0) * 100) STORED,
+    close_r_24h             double precision GENERATED ALWAYS AS ((close - close_24h) / NULLIF(close_24h, 0) * 100) STORED,
+    posts_created_r_1h      double precision GENERATED ALWAYS AS ((posts_created - posts_created_1h)::double precision / NULLIF(posts_created_1h, 0) * 100) STORED,
+    posts_created_r_24h     double precision GENERATED ALWAYS AS ((posts_created - posts_created_24h)::double precision / NULLIF(posts_created_24h, 0) * 100) STORED,
+    interactions_r_1h       double precision GENERATED ALWAYS AS ((interactions - interactions_1h)::double precision / NULLIF(interactions_1h, 0) * 100) STORED,
+    interactions_r_24h      double precision GENERATED ALWAYS AS ((interactions - interactions_24h)::double precision / NULLIF(interactions_24h, 0) * 100) STORED
+);
+
+-- First fill from the whole table, afterwards the merges keep it current
+INSERT INTO landing.symbol_changes (
+    symbol_id, time_unix, datetime,
+    close, close_1h, close_24h,
+    posts_created, posts_created_1h, posts_created_24h,
+    interactions, interactions_1h, interactions_24h
+)
+SELECT
+    l.symbol_id, l.time_unix, now_row.datetime,
+    now_row.close, h1.close, h24.close,
+    now_row.posts_created, h1.posts_created, h24.posts_created,
+    now_row.interactions, h1.interactions, h24.interactions
+FROM (
+    SELECT symbol_id, max(time_unix) AS time_unix
+    FROM landing.lunar_data
+    GROUP BY symbol_id
+) l
+JOIN landing.lunar_data now_row
+    ON now_row.symbol_id = l.symbol_id AND now_row.time_unix = l.time_unix
+LEFT JOIN landing.lunar_data h1
+    ON h1.symbol_id = l.symbol_id AND h1.time_unix = l.time_unix - 3600
+LEFT JOIN landing.lunar_data h24
+    ON h24.symbol_id = l.symbol_id AND h24.time_unix = l.time_unix - 86400
+ON CONFLICT (symbol_id) DO NOTHING;
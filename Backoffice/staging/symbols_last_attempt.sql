@@ -0,0 +1,4 @@
+-- Unix time of the last ETL fetch per symbol, also when it returned no new hours.
+-- symbol_scheduler measures staleness from it as well as from last_timestamp, so a
+-- symbol without new data is polled once per hour instead of on every round.
+ALTER TABLE public.symbols ADD COLUMN IF NOT EXISTS last_attempt double precision;
@@ -0,0 +1,193 @@
+import time
+
+from sqlalchemy import text
+
+from db import get_engine
+from metrics import get_metrics
+
+
+# Metrics of landing.symbol_changes (Top Gainers), each stored as latest, 1h and 24h before
+gainer_columns = ['close', 'posts_created', 'interactions']
+
+# Same columns as the former materialized views, see staging/summary_tables.sql
+summary_select = """
+    ld.symbol_id,
+    s.symbol AS symbol_ticker,
+    s.name AS symbol_name,
+    ld.datetime,
+    ld.time_unix,
+    ld.open,
+    ld.high,
+    ld.low,
+    ld.close,
+    ld.volume_24h,
+    ld.market_cap,
+    ld.circulating_supply,
+    ld.sentiment,
+    ld.contributors_active,
+    ld.contributors_created,
+    ld.posts_active,
+    ld.posts_created,
+    ld.interactions,
+    ld.social_dominance,
+    ld.galaxy_score,
+    ld.volatility,
+    ld.alt_rank,
+    ld.spam
+"""
+
+
+def refresh_market_data_summary(connection, symbol_ids: list[int]) -> int:
+    """
+    Replaces the latest, 1h-before and 24h-before rows of symbol_ids in landing.market_data_summary_1_24.
+    """
+    connection.execute(text("DELETE FROM landing.market_data_summary_1_24 WHERE symbol_id = ANY(:symbol_ids)"),
+                       {'symbol_ids': symbol_ids})
+    result = connection.execute(text(f"""
+        INSERT INTO landing.market_data_summary_1_24
+        SELECT {summary_select}
+        FROM public.symbols s
+        JOIN landing.lunar_data ld
+            ON ld.symbol_id = s.id
+           -- last_timestamp is double precision, cast so the (symbol_id, time_unix) index applies
+           AND ld.time_unix IN (s.last_timestamp::bigint, s.last_timestamp::bigint - 3600, s.last_timestamp::bigint - 86400)
+        WHERE s.id = ANY(:symbol_ids)
+    """), {'symbol_ids': symbol_ids})
+    return result.rowcount
+
+
+def refresh_lunar_data_etl(connection, symbol_ids: list[int]) -> int:
+    """
+    Replaces the rows of symbol_ids in landing.lunar_data_etl: the last 72 hours before
+    last_update of the include_etl symbols.
+    """
+    connection.execute(text("DELETE FROM landing.lunar_data_etl WHERE symbol_id = ANY(:symbol_ids)"),
+                       {'symbol_ids': symbol_ids})
+    result = connection.execute(text("""
+        INSERT INTO landing.lunar_data_etl
+        SELECT s.symbol, ld.*
+        FROM public.symbols s
+        JOIN landing.lunar_data ld
+            ON ld.symbol_id = s.id
+           AND ld.datetime >= s.last_update - INTERVAL '72 hours'
+        WHERE s.include_etl = TRUE
+          AND s.id = ANY(:symbol_ids)
+    """), {'symbol_ids': symbol_ids})
+    return result.rowcount
+
+
+def refresh_symbol_changes(connection, symbol_ids: list[int]) -> int:
+    """
+    Brings the rows of symbol_ids in landing.symbol_changes up to date. Per symbol it costs
+    four index lookups: the latest hour, then the hours 1h and 24h before it.
+    """
+    def lookup(alias, offset, join='LEFT JOIN'):
+        # The datetime range only lets Postgres prune partitions, time_unix does the matching
+        hour = f"l.time_unix - {offset}" if offset else "l.time_unix"
+        return f"""
+            {join} LATERAL (
+                SELECT datetime, {', '.join(gainer_columns)}
+                FROM landing.lunar_data ld
+                WHERE ld.symbol_id = l.symbol_id
+                  AND ld.time_unix = {hour}
+                  AND ld.datetime >= (to_timestamp({hour}) AT TIME ZONE 'UTC') - interval '1 day'
+                  AND ld.datetime <= (to_timestamp({hour}) AT TIME ZONE 'UTC') + interval '1 day'
+                LIMIT 1
+            ) {alias} ON true"""
+
+    columns = ['symbol_id', 'time_unix', 'datetime']
+    values = ['l.symbol_id', 'l.time_unix', 'now_row.datetime']
+    for col in gainer_columns:
+        columns += [col, f"{col}_1h", f"{col}_24h"]
+        values += [f"now_row.{col}", f"h1.{col}", f"h24.{col}"]
+    update_set = ', '.join(f"{col} = EXCLUDED.{col}" for col in columns[1:])
+
+    query = text(f"""
+        INSERT INTO landing.symbol_changes AS symbol_changes ({', '.join(columns)})
+        SELECT {', '.join(values)}
+        FROM unnest(CAST(:symbol_ids AS bigint[])) AS t(symbol_id)
+        CROSS JOIN LATERAL (
+            SELECT symbol_id, time_unix
+            FROM landing.lunar_data
+            WHERE symbol_id = t.symbol_id
+            ORDER BY time_unix DESC
+            LIMIT 1
+        ) l
+        {lookup('now_row', 0, join='JOIN')}
+        {lookup('h1', 3600)}
+        {lookup('h24', 86400)}
+        ON CONFLICT (symbol_id) DO UPDATE SET {update_set}, updated_at = now()
+    """)
+    return connection.execute(query, {'symbol_ids': symbol_ids}).rowcount
+
+
+# Summary table -> function refreshing it for a list of symbol_ids
+summaries = {
+    "landing.market_data_summary_1_24": refresh_market_data_summary,
+    "landing.lunar_data_etl": refresh_lunar_data_etl,
+    "landing.symbol_changes": refresh_symbol_changes,
+}
+
+
+def refresh_summaries(connection, source_table: str, mode: str = "incremental") -> dict:
+    """
+    Refreshes every summary table for the symbols present in source_table, in the caller's
+    transaction, so readers never see lunar_data and its summaries disagree. The cost of
+    each refresh goes to landing.summary_refresh_log and the metrics registry.
+    Requires the tables from staging/summary_tables.sql and staging/symbol_changes.sql.
+
+    Args:
+    connection: SQLAlchemy connection with an open transaction, after the merge and after
+                public.symbols got its new last_update / last_timestamp.
+    source_table (str): Schema qualified table holding the merged rows.
+    mode (str): Recorded in the log, "incremental" or "full".
+
+    Returns:
+    dict: summary table -> {"rows": rows written, "elapsed_time": seconds}.
+    """
+    metrics = get_metrics()
+    # The merged rows are only needed for their symbols; with a constant list Postgres plans index lookups
+    symbol_ids = [int(symbol_id) for symbol_id in
+                  connection.execute(text(f"SELECT DISTINCT symbol_id FROM {source_table}")).scalars()]
+    report = {}
+    for summary, refresh in summaries.items():
+        start_time = time.perf_counter()
+        rows = refresh(connection, symbol_ids)
+        elapsed_time = time.perf_counter() - start_time
+
+        connection.execute(text("""
+            INSERT INTO landing.summary_refresh_log (summary, mode, symbols, rows, elapsed_time, refreshed_at)
+            VALUES (:summary, :mode, :symbols, :rows, :elapsed_time, now())
+        """), {'summary': summary, 'mode': mode, 'symbols': len(symbol_ids), 'rows': rows, 'elapsed_time': elapsed_time})
+
+        metrics.observe("landing_summary_refresh_seconds", elapsed_time, summary=summary, mode=mode)
+        metrics.inc("landing_summary_rows_total", rows, summary=summary)
+        metrics.set("landing_summary_refreshed_at", time.time(), summary=summary)
+        report[summary] = {"rows": rows, "elapsed_time": elapsed_time}
+    return report
+
+
+def rebuild_summaries() -> tuple[int, dict]:
+    """
+    Rebuilds every summary table from the whole of landing.lunar_data, e.g. the first time
+    or after include_etl changed for some symbols.
+
+    Returns:
+    Tuple[int, dict]: result code (9011 on error) and the refresh report.
+    """
+    try:
+        engine = get_engine("ingestion")
+        with engine.begin() as connection:
+            for summary in summaries:
+                connection.execute(text(f"TRUNCATE TABLE {summary}"))
+            report = refresh_summaries(connection, "landing.lunar_data", mode="full")
+        return 1, report
+    except Exception as e:
+        print(f"Error rebuilding summary tables: {e}")
+        return 9011, {}
+
+
+if __name__ == "__main__":
+    # python summary_refresh.py  -> rebuilds every summary table
+    result_code, report = rebuild_summaries()
+    print(result_code, report)
@@ -1,14 +1,18 @@
-from datetime import datetime
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+import pandas as pd
+from sqlalchemy import text
 
-from config import connection_string
+from db import get_engine
+from summary_refresh import refresh_summaries
+from request_logger import get_api_request_writer
 
 def register_api_request(service: str, key_name: str, function_name: str, url: str):
     """
     Register an API request in the database by logging the service, key_name, 
     function_name, url, and current timestamp.
 
+    The record is queued and written to api_request_logs in batches by the
+    background ApiRequestLogWriter, so the call does not wait for the database.
+
     Args:
     service (str): The name of the service (e.g., "LunarCrush", "Binance").
     key_name (str): The name of the API key used.
@@ -18,123 +22,171 @@ def register_api_request(service: str, key_name: str, function_name: str, url: s
     Returns:
     None
     """
-    try:
-        # Create SQLAlchemy engine using the connection string
-        engine = create_engine(connection_string)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        # Ensure the session is connected to the public schema
-        session.execute(text("SET search_path TO public"))
-
-        # Insert the log entry into the database
-        query = text("""
-            INSERT INTO api_request_logs (service, key_name, timestamp, function_name, url)
-            VALUES (:service, :key_name, :timestamp, :function_name, :url)
-        """)
-        session.execute(query, {
-            'service': service,
-            'key_name': key_name,
-            'timestamp': datetime.now(),
-            'function_name': function_name,
-            'url': url
-        })
-        session.commit()
-        
-    except Exception as e:
-        session.rollback()
-        raise RuntimeError(f"Failed to register API request: {e}")
-    finally:
-        session.close()
+    get_api_request_writer().submit(service, key_name, function_name, url)
+
+
+import time
+
+lunar_data_columns = [
+    'symbol_id', 'datetime', 'time_unix', 'open', 'high', 'low', 'close', 'volume_24h', 'market_cap',
+    'circulating_supply', 'sentiment', 'contributors_active', 'contributors_created',
+    'posts_active', 'posts_created', 'interactions', 'social_dominance', 'galaxy_score',
+    'volatility', 'alt_rank', 'spam'
+]
+
+# In-memory dtypes of lunar_data_columns, for frames read back for the dashboard
+# (read_symbol_data and the symbol cache). Counts are nullable integers, so a missing hour
+# stays <NA> instead of turning the column into float64. The four score columns only need
+# float32, prices, volumes, market caps and supplies stay float64.
+lunar_data_dtypes = {
+    'symbol_id': 'int32',
+    'datetime': 'datetime64[s]',
+    'time_unix': 'int64',
+    'open': 'float64',
+    'high': 'float64',
+    'low': 'float64',
+    'close': 'float64',
+    'volume_24h': 'float64',
+    'market_cap': 'float64',
+    'circulating_supply': 'float64',
+    'sentiment': 'float32',
+    'contributors_active': 'Int32',
+    'contributors_created': 'Int32',
+    'posts_active': 'Int32',
+    'posts_created': 'Int32',
+    'interactions': 'Int64',
+    'social_dominance': 'float32',
+    'galaxy_score': 'float32',
+    'volatility': 'float32',
+    'alt_rank': 'Int32',
+    'spam': 'Int32',
+}
+
+# Dtypes of frames written to landing.lunar_data (parse_lunar_data, COPY). They match the
+# table (bigint, double precision), so stored values are never rounded, and a field
+# missing from the payload becomes a typed NULL column instead of object.
+lunar_write_widths = {'int32': 'int64', 'Int32': 'Int64', 'float32': 'float64'}
+lunar_write_dtypes = {col: lunar_write_widths.get(dtype, dtype) for col, dtype in lunar_data_dtypes.items()}
+
+
+def apply_lunar_dtypes(data_df: pd.DataFrame, dtypes: dict | None = None) -> pd.DataFrame:
+    """
+    Casts the lunar_data_columns present in data_df to dtypes (lunar_data_dtypes by default),
+    other columns (e.g. symbol_ticker) are left as they are. Counts are rounded first, the API
+    or a bigint column read with NULLs may hand them over as floats.
+    """
+    if dtypes is None:
+        dtypes = lunar_data_dtypes
+
+    columns = {}
+    for col, dtype in dtypes.items():
+        if col not in data_df.columns:
+            continue
+        values = data_df[col]
+        if not dtype.startswith('datetime'):
+            values = pd.to_numeric(values)
+            if dtype.lower().startswith('int') and values.dtype.kind == 'f':
+                values = values.round()
+        columns[col] = values.astype(dtype)
+    return data_df.assign(**columns)
+
+
+# Natural key of landing.lunar_data. datetime is derived from time_unix, it is part of the
+# key only because a unique index on a partitioned table must contain the partition column.
+lunar_data_key = ['symbol_id', 'time_unix', 'datetime']
 
 
-def read_key_usage(default_keys=None) -> dict:
+def merge_lunar_data(connection, source_table: str) -> dict:
     """
-    Reads the key usage information from the public.key_usage view for all keys.
-    Initializes with default values if no records are found.
+    Upserts rows from source_table into landing.lunar_data on (symbol_id, time_unix).
+    New hours are inserted, changed hours updated and identical hours left untouched,
+    so refetched or overlapping windows never create duplicates.
+    Requires the unique index from staging/lunar_data_unique_key.sql.
 
     Args:
-    default_keys (list): A list of default key names to initialize with if no records are found.
+    connection: SQLAlchemy connection with an open transaction.
+    source_table (str): Schema qualified table holding rows in the landing.lunar_data layout.
 
     Returns:
-    dict: A dictionary where each key is the key_name and the value is a dictionary
-          containing the usage counts for the last minute, hour, and day.
+    dict: Counts of source rows, inserted, updated and skipped rows.
     """
-    if default_keys is None:
-        default_keys = ["key_outlook"]
-
-    try:
-        # Create SQLAlchemy engine using the connection string
-        engine = create_engine(connection_string)
-        with engine.connect() as connection:
-            # Query the view for all keys' usage data
-            query = text("""
-                SELECT 
-                    key_name,
-                    request_count_minute,
-                    request_count_hour,
-                    request_count_day
-                FROM 
-                    public.key_usage
-            """)
-            result = connection.execute(query).fetchall()
-
-            # Initialize usage data with default keys and zero counts
-            usage_data = {
-                key: {"minute": 0, "hour": 0, "day": 0} for key in default_keys
-            }
-
-            # Update usage_data with actual data from the query result
-            for row in result:
-                usage_data[row[0]] = {  # Access the first column as row[0] which is key_name
-                    "minute": row[1],   # Access the second column as row[1] which is request_count_minute
-                    "hour": row[2],     # Access the third column as row[2] which is request_count_hour
-                    "day": row[3]       # Access the fourth column as row[3] which is request_count_day
-                }
-
-            return usage_data
+    columns = ', '.join(lunar_data_columns)
+    key = ', '.join(lunar_data_key)
+    values = [col for col in lunar_data_columns if col not in lunar_data_key]
+    update_set = ', '.join(f"{col} = EXCLUDED.{col}" for col in values)
+    changed = ' OR '.join(f"lunar_data.{col} IS DISTINCT FROM EXCLUDED.{col}" for col in values)
+
+    query = text(f"""
+        WITH source AS (
+            -- The same hour can be fetched twice before a merge, keep the latest copy
+            SELECT DISTINCT ON (symbol_id, time_unix) {columns}
+            FROM {source_table}
+            ORDER BY symbol_id, time_unix, ctid DESC
+        ),
+        existing AS (
+            -- Sees landing.lunar_data as it was before the insert below
+            SELECT s.symbol_id, s.time_unix
+            FROM source s
+            JOIN landing.lunar_data l USING ({key})
+        ),
+        merged AS (
+            INSERT INTO landing.lunar_data AS lunar_data ({columns})
+            SELECT {columns} FROM source
+            ON CONFLICT ({key}) DO UPDATE SET {update_set}
+            WHERE {changed}
+            RETURNING symbol_id, time_unix
+        )
+        SELECT
+            (SELECT count(*) FROM {source_table}) AS source_rows,
+            count(*) FILTER (WHERE e.symbol_id IS NULL) AS inserted,
+            count(*) FILTER (WHERE e.symbol_id IS NOT NULL) AS updated
+        FROM merged m
+        LEFT JOIN existing e USING (symbol_id, time_unix)
+    """)
+    source_rows, inserted, updated = connection.execute(query).one()
+
+    return {
+        "source_rows": source_rows,
+        "inserted": inserted,
+        "updated": updated,
+        "skipped": source_rows - inserted - updated
+    }
+
+
+def dump_lunar_buffer(buffer_table: str = "landing.buffer_lunar_data") -> tuple[int, dict]:
+    """
+    Merges the data from landing.buffer_lunar_data into landing.lunar_data
+    and then truncates the buffer table, in one transaction.
 
-    except Exception as e:
-        raise RuntimeError(f"Failed to read key usage: {e}")
-    
-import time
-from sqlalchemy import create_engine, text
-from config import connection_string
+    Args:
+    buffer_table (str): Schema qualified buffer, another table with the same layout e.g. for benchmarks.
 
-def dump_lunar_buffer():
-    """
-    Dumps the data from landing.buffer_lunar_data into landing.lunar_data
-    and then truncates the buffer table. Measures and prints the execution time.
-    Waits for confirmation that the transaction succeeded.
+    Returns:
+    Tuple[int, dict]: result code and the merge report: source_rows, inserted, updated, skipped, elapsed_time
+    and summaries, the refresh cost per summary table.
     """
     try:
-        # Create SQLAlchemy engine using the connection string
-        engine = create_engine(connection_string)
+        # Use the shared ingestion engine
+        engine = get_engine("ingestion")
         
         start_time = time.time()
         
-        with engine.connect() as connection:
-            with connection.begin():  # Start a transaction block
-                # Execute the insert and truncate operations
-                query = text("""
-                    INSERT INTO landing.lunar_data (symbol_id, datetime, time_unix, open, high, low, close, volume_24h, market_cap, 
-                                                    circulating_supply, sentiment, contributors_active, contributors_created, 
-                                                    posts_active, posts_created, interactions, social_dominance, galaxy_score, 
-                                                    volatility, alt_rank, spam)
-                    SELECT symbol_id, datetime, time_unix, open, high, low, close, volume_24h, market_cap, circulating_supply, 
-                           sentiment, contributors_active, contributors_created, posts_active, posts_created, interactions, 
-                           social_dominance, galaxy_score, volatility, alt_rank, spam
-                    FROM landing.buffer_lunar_data;
-                """)
-                
-                connection.execute(query)
-
-                # Truncate the buffer table after the insert is successful
-                connection.execute(text("TRUNCATE TABLE landing.buffer_lunar_data;"))
+        with engine.begin() as connection:
+            # Block concurrent writers so the truncate only removes rows that were merged
+            connection.execute(text(f"LOCK TABLE {buffer_table} IN SHARE ROW EXCLUSIVE MODE;"))
+
+            report = merge_lunar_data(connection, buffer_table)
+
+            # Only the symbols in the buffer, save_lunar_data already moved their last_update / last_timestamp
+            if report["source_rows"]:
+                report["summaries"] = refresh_summaries(connection, buffer_table)
+
+            # Truncate the buffer table after the merge is successful
+            connection.execute(text(f"TRUNCATE TABLE {buffer_table};"))
         
-        elapsed_time = time.time() - start_time
-        #print(f"🔄️ Dumping the buffer: {elapsed_time:.2f} sec")
+        report["elapsed_time"] = time.time() - start_time
+        return 1, report
 
     except Exception as e:
         print(f"Failed to dump lunar buffer: {e}")
-
+        return 9006, {}
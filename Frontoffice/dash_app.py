@@ -4,15 +4,32 @@ import os
 # Add the parent directory (project_root) to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
 
-from dash import Dash, dcc, html, Output, Input
+from dash import Dash, dcc, html, dash_table, Output, Input, callback_context
 import dash_bootstrap_components as dbc
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from Backoffice.loading import dash_data_functions as ddf
+from Backoffice.loading.market_cache import MarketDataCache, market_cache_ttl, page_market_data
+from Backoffice.loading.symbol_cache import SymbolHistoryCache
+from Backoffice.loading.resampling import ResampleCache, resample_rules
+from Backoffice.loading.downsampling import downsample, visible_window, chart_points
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.SOLAR])
 
 # --------------------------------- Data ------------------------------------
-# Fetch initial market data (static at startup, can be dynamic in callbacks)
-market_data = ddf.read_market_data_summary_1_24()
+# Market data is refreshed in the background; callbacks only slice the current snapshot
+market_cache = MarketDataCache(ddf.read_market_data_summary_1_24, ttl=market_cache_ttl)
+market_cache.start()
+market_data = market_cache.view('all')
+
+# Per-symbol history, topped up incrementally on repeat requests
+symbol_cache = SymbolHistoryCache(ddf.read_symbol_data)
+
+# 4h/1d/1w bars per symbol, re-aggregated only from the last bars on
+resample_cache = ResampleCache(symbol_cache.get)
+
+# Rows sent to the browser per table page
+market_page_size = 25
 
 # Define the default columns to display
 default_columns = ['symbol_ticker', 'close', 'posts_created', 'interactions', 'include_etl']
@@ -20,6 +37,17 @@ default_columns = ['symbol_ticker', 'close', 'posts_created', 'interactions', 'i
 # Columns to choose from in the dropdown
 column_options = [{'label': col, 'value': col} for col in market_data.columns]
 
+# Symbol chart controls
+symbol_options = [{'label': row.symbol_ticker, 'value': row.symbol_id}
+                  for row in market_data.itertuples(index=False)] if 'symbol_ticker' in market_data.columns else []
+series_options = [{'label': col, 'value': col} for col in resample_rules]
+timeframe_options = [{'label': timeframe, 'value': timeframe} for timeframe in ['1h', '4h', '1d', '1w']]
+
+# Top Gainers leaderboard
+gainer_options = [{'label': label, 'value': metric} for metric, label in ddf.gainer_metrics.items()]
+period_options = [{'label': period, 'value': period} for period in ddf.change_periods]
+top_gainers_count = 10
+
 # Predefined filters
 filter_options = [
     {'label': 'All', 'value': 'all'},
@@ -42,8 +70,23 @@ content = dbc.Row(
         dbc.Col(
             [
                 html.H2("Symbols", className="text-center text-info mb-4"),
-                # Data Table showing selected columns
-                html.Div(id='market-stats-output', className="left-column market-stats-table mb-4"),
+                # Data Table showing selected columns; paging, sorting and filtering run on the server
+                html.Div(
+                    dash_table.DataTable(
+                        id='market-stats-table',
+                        page_current=0,
+                        page_size=market_page_size,
+                        page_action='custom',
+                        sort_action='custom',
+                        sort_mode='multi',
+                        sort_by=[],
+                        filter_action='custom',
+                        filter_query='',
+                        style_table={'overflowX': 'auto'},
+                    ),
+                    id='market-stats-output',
+                    className="left-column market-stats-table mb-4"
+                ),
                 # Dropdown for selecting which columns to display
                 dcc.Dropdown(
                     id='column-dropdown',
@@ -61,6 +104,8 @@ content = dbc.Row(
                     labelStyle={'display': 'inline-block', 'margin-right': '10px'},
                     className="mb-4"
                 ),
+                # Picks up new market data snapshots
+                dcc.Interval(id='market-refresh', interval=market_cache_ttl * 1000),
             ],
             width=4
         ),
@@ -68,7 +113,32 @@ content = dbc.Row(
         # Right Column - Symbol-specific data
         dbc.Col(
             [
-                html.Div(id='symbol-data-output', className="right-column bg-dark text-white p-3"),
+                html.Div(
+                    [
+                        dcc.Dropdown(id='symbol-dropdown', options=symbol_options,
+                                     value=symbol_options[0]['value'] if symbol_options else None, className="mb-2"),
+                        dcc.Dropdown(id='series-dropdown', options=series_options, value=['close', 'interactions'],
+                                     multi=True, className="mb-2"),
+                        dcc.RadioItems(id='timeframe-radio', options=timeframe_options, value='1h',
+                                       labelStyle={'display': 'inline-block', 'margin-right': '10px'}),
+                        dcc.Graph(id='symbol-chart'),
+                    ],
+                    id='symbol-data-output',
+                    className="right-column bg-dark text-white p-3"
+                ),
+                # Top Gainers, read from the incrementally maintained landing.symbol_changes
+                html.Div(
+                    [
+                        html.H4("Top Gainers", className="text-info mb-2"),
+                        dcc.RadioItems(id='gainer-metric-radio', options=gainer_options, value='close',
+                                       labelStyle={'display': 'inline-block', 'margin-right': '10px'}),
+                        dcc.RadioItems(id='gainer-period-radio', options=period_options, value='24h',
+                                       labelStyle={'display': 'inline-block', 'margin-right': '10px'}, className="mb-2"),
+                        dash_table.DataTable(id='top-gainers-table', style_table={'overflowX': 'auto'}),
+                    ],
+                    id='top-gainers-output',
+                    className="right-column bg-dark text-white p-3"
+                ),
                 html.Div(ddf.hello, className="right-column bg-dark text-white p-3")
             ],
             width=8
@@ -81,28 +151,89 @@ app.layout = dbc.Container([header, content], fluid=True, className="dash-contai
 
 # --------------------------------- Callbacks ------------------------------------
 @app.callback(
-    Output('market-stats-output', 'children'),
+    Output('market-stats-table', 'data'),
+    Output('market-stats-table', 'columns'),
+    Output('market-stats-table', 'page_count'),
     Input('column-dropdown', 'value'),
-    Input('filter-radio', 'value')
+    Input('filter-radio', 'value'),
+    Input('market-stats-table', 'page_current'),
+    Input('market-stats-table', 'page_size'),
+    Input('market-stats-table', 'sort_by'),
+    Input('market-stats-table', 'filter_query'),
+    Input('market-refresh', 'n_intervals')
 )
-def update_market_stats(selected_columns, selected_filter):
-    # Filter the data based on the selected filter
-    if selected_filter == 'watched':
-        filtered_data = market_data[market_data['include_etl'] == True]
-    else:
-        filtered_data = market_data.copy()  # All data
-
-    # Sort by last_update descending
-    filtered_data.sort_values(by='last_update', ascending=False, inplace=True)
+def update_market_stats(selected_columns, selected_filter, page_current, page_size, sort_by, filter_query, n_intervals):
+    # Pre-filtered view, sorted by last_update descending unless the table asks for another order
+    filtered_data = market_cache.sorted_view(selected_filter, sort_by)
+
+    # Only the visible page of the chosen columns goes to the browser
+    records, page_count, rows = page_market_data(filtered_data, selected_columns or [], page_current, page_size, filter_query)
+    columns = [{'name': col, 'id': col} for col in selected_columns or [] if col in filtered_data.columns]
+
+    return records, columns, page_count
+
+def read_x_range(relayout_data):
+    """
+    Returns the zoomed (start, end) from a Graph relayoutData event, None for the full range.
+    """
+    if not relayout_data:
+        return None
+    for key, value in relayout_data.items():
+        if key.startswith('xaxis') and key.endswith('.range[0]'):
+            return value, relayout_data[key.replace('[0]', '[1]')]
+        if key.startswith('xaxis') and key.endswith('.range'):
+            return tuple(value)
+    return None
 
-    # Select only the chosen columns
-    displayed_data = filtered_data[selected_columns]
 
-    # Optionally, limit the number of rows to display
-    #displayed_data = displayed_data.head(10)
+@app.callback(
+    Output('symbol-chart', 'figure'),
+    Input('symbol-dropdown', 'value'),
+    Input('series-dropdown', 'value'),
+    Input('timeframe-radio', 'value'),
+    Input('symbol-chart', 'relayoutData')
+)
+def update_symbol_chart(symbol_id, selected_series, timeframe, relayout_data):
+    selected_series = selected_series or []
+    figure = make_subplots(rows=max(len(selected_series), 1), cols=1, shared_xaxes=True, vertical_spacing=0.03)
+    # Keeps the user's zoom when the figure is replaced
+    figure.update_layout(template='plotly_dark', uirevision=f"{symbol_id}-{timeframe}", showlegend=False,
+                         height=250 * max(len(selected_series), 1), margin={'l': 40, 'r': 10, 't': 10, 'b': 30})
+    if symbol_id is None:
+        return figure
+
+    # relayoutData keeps the last zoom of the graph, which belongs to the previous symbol or
+    # timeframe when another input fired the callback
+    if not any(trigger['prop_id'] == 'symbol-chart.relayoutData' for trigger in callback_context.triggered):
+        relayout_data = None
+
+    if timeframe == '1h':
+        data = symbol_cache.get(symbol_id)
+    else:
+        data = resample_cache.get(symbol_id, timeframe)
+
+    # Full resolution for the visible window only, downsampled to about one point per pixel
+    window = visible_window(data, read_x_range(relayout_data))
+    for row, col in enumerate(selected_series, start=1):
+        if col not in window.columns:
+            continue
+        # Method per column from downsampling.downsample_methods
+        points = downsample(window, col, chart_points)
+        figure.add_trace(go.Scattergl(x=points['datetime'], y=points[col], mode='lines', name=col), row=row, col=1)
+        figure.update_yaxes(title_text=col, row=row, col=1)
+    return figure
 
-    # Return the data as a table
-    return dbc.Table.from_dataframe(displayed_data, striped=True, bordered=True, hover=True)
+@app.callback(
+    Output('top-gainers-table', 'data'),
+    Output('top-gainers-table', 'columns'),
+    Input('gainer-metric-radio', 'value'),
+    Input('gainer-period-radio', 'value'),
+    Input('market-refresh', 'n_intervals')
+)
+def update_top_gainers(metric, period, n_intervals):
+    data = ddf.read_top_gainers(metric, period, top_gainers_count)
+    columns = [{'name': col, 'id': col} for col in data.columns if col not in ('symbol_id', 'symbol_name')]
+    return data.round({'change_r': 2}).to_dict('records'), columns
 
 # --------------------------------- Run App ------------------------------------
 if __name__ == '__main__':